@@ -5,7 +5,9 @@ import sys
 import config
 from app.routes.whatsapp import whatsapp_blueprint
 from app.routes.sync import sync_blueprint
-from app.extensions import db
+from app.routes.metrics import metrics_blueprint
+from app.extensions import db, message_workers
+from app.utils import outbox, pipeline, summaries, whatsapp
 
 def create_app():
     app = Flask(__name__)
@@ -20,8 +22,13 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     db.init_app(app)
+    message_workers.init_app(app, whatsapp.process_message_event)
+    outbox.sender.init_app(app)
+    summaries.folder.init_app(app)
+    pipeline.pipeline.init_app(app)
 
     app.register_blueprint(whatsapp_blueprint)
     app.register_blueprint(sync_blueprint)
+    app.register_blueprint(metrics_blueprint)
 
     return  app
@@ -1,3 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
\ No newline at end of file
+import config
+from app.utils.workers import MessageWorkerPool
+
+db = SQLAlchemy()
+message_workers = MessageWorkerPool(size=config.WORKER_POOL_SIZE, queue_size=config.WORKER_QUEUE_SIZE)
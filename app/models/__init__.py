@@ -1,11 +1,129 @@
 from app.extensions import db
 from datetime import datetime
+import logging
+
+from sqlalchemy import inspect, text
 
 class WhatsappMessage(db.Model):
+    __table_args__ = (
+        db.Index("ix_whatsapp_message_user_id_created_at", "user_id", "created_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Text)
+    # WhatsApp's id for inbound messages; unique so re-delivered webhooks cannot be processed twice
+    wa_message_id = db.Column(db.Text, nullable=True, unique=True, index=True)
+    # Set while a reply to this inbound message is in progress; None once the reply is handed off
+    claimed_until = db.Column(db.DateTime, nullable=True)
     text = db.Column(db.Text, nullable=True)
     file_url = db.Column(db.Text, nullable=True)
     is_received = db.Column(db.Boolean, nullable=False, default=False)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ConversationSummary(db.Model):
+    """Rolling summary of a user's messages older than the live history window."""
+    user_id = db.Column(db.Text, primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default="")
+    # Newest WhatsappMessage.id folded into the summary
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class Campaign(db.Model):
+    """Structured copy of the Friday campaigns, refreshed by every sync."""
+    __table_args__ = (
+        db.Index("ix_campaign_start_date_end_date", "start_date", "end_date"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Friday's id, or the campaign name when the API does not send one
+    external_id = db.Column(db.Text, nullable=False, unique=True)
+    name = db.Column(db.Text, nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    brand = db.Column(db.Text, nullable=True)
+    location = db.Column(db.Text, nullable=True)
+    # Lower-cased copies used for indexed lookups
+    brand_key = db.Column(db.Text, nullable=True, index=True)
+    location_key = db.Column(db.Text, nullable=True, index=True)
+    start_date = db.Column(db.Date, nullable=True)
+    end_date = db.Column(db.Date, nullable=True)
+    kilometers_per_month = db.Column(db.Float, nullable=True)
+    pay_per_month = db.Column(db.Float, nullable=True)
+    max_drivers = db.Column(db.Integer, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class IndexAlias(db.Model):
+    """Which namespace (generation) of a Pinecone index is currently served."""
+    index_name = db.Column(db.Text, primary_key=True)
+    active_namespace = db.Column(db.Text, nullable=False)
+    previous_namespace = db.Column(db.Text, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class SyncManifest(db.Model):
+    """What the last successful sync indexed for one source item in one index generation."""
+    __table_args__ = (
+        db.UniqueConstraint("index_name", "namespace", "source", "key", name="uq_sync_manifest_item"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    index_name = db.Column(db.Text, nullable=False)
+    namespace = db.Column(db.Text, nullable=False)
+    source = db.Column(db.Text, nullable=False)
+    key = db.Column(db.Text, nullable=False)
+    name = db.Column(db.Text, nullable=True)
+    modified_time = db.Column(db.Text, nullable=True)
+    content_hash = db.Column(db.Text, nullable=True)
+    chunk_count = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class OutboundMessage(db.Model):
+    """Outbox row for a reply waiting to be sent (or already sent) through the Graph API."""
+    __table_args__ = (
+        db.Index("ix_outbound_message_status_next_attempt_at", "status", "next_attempt_at"),
+        db.Index("ix_outbound_message_recipient_status", "recipient", "status"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    phone_number_id = db.Column(db.Text, nullable=False)
+    recipient = db.Column(db.Text, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    # pending -> sending -> sent -> delivered -> read, or failed
+    status = db.Column(db.Text, nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    wa_message_id = db.Column(db.Text, nullable=True, unique=True, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+def upgrade_schema():
+    """
+    Create missing tables, then add columns and indexes declared since a table
+    was created (create_all skips existing tables). Only nullable columns are
+    added, so existing rows stay valid.
+    """
+    db.create_all()
+
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            logging.info(f"Adding column {table.name}.{column.name}")
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+        for table_index in table.indexes:
+            table_index.create(db.engine, checkfirst=True)
@@ -0,0 +1,35 @@
+from flask import Blueprint, Response
+
+from app.extensions import message_workers
+from app.utils import campaigns
+from app.utils import ingest
+from app.utils import intents
+from app.utils import llm
+from app.utils import metrics
+from app.utils import outbox
+from app.utils import pipeline
+from app.utils import summaries
+from app.utils import whatsapp
+
+metrics_blueprint = Blueprint("metrics", __name__)
+
+# Existing stats() sources, exported as gauges at scrape time
+metrics.registry.register_collector("workers", message_workers.stats)
+metrics.registry.register_collector("outbox", outbox.sender.stats)
+metrics.registry.register_collector("history_cache", whatsapp.history_cache.stats)
+metrics.registry.register_collector("dedup", whatsapp.recent_message_ids.stats)
+metrics.registry.register_collector("query_cache", llm.query_cache.stats)
+metrics.registry.register_collector("ingest", ingest.stats)
+metrics.registry.register_collector("intents", intents.stats)
+metrics.registry.register_collector("campaign_lookup", campaigns.stats)
+metrics.registry.register_collector("summaries", summaries.folder.stats)
+metrics.registry.register_collector("pipeline", pipeline.pipeline.stats)
+metrics.registry.register_collector("completion_circuit", llm.breaker.stats)
+metrics.registry.register_collector("completion_latency", llm.completion_latency.stats)
+if llm.answer_cache is not None:
+    metrics.registry.register_collector("answer_cache", llm.answer_cache.stats)
+
+
+@metrics_blueprint.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -1,160 +1,556 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Tuple
 
-from flask import Blueprint
+from flask import Blueprint, current_app, request
 import config
+from app.utils import campaigns
 from app.utils import friday
 from app.utils import gdoc
+from app.utils import generations
+from app.utils import manifest
+from app.utils import retriever
+from app.utils.decorators import sync_key_required
+from app.utils.embedding_batcher import EmbeddingBatcher
+from app.utils.embedding_store import EmbeddingStore
 from openai import OpenAI
-from pinecone import Pinecone, ServerlessSpec
+import hashlib
 import logging
 import time
 
 sync_blueprint = Blueprint("sync", __name__)
 logger = logging.getLogger(__name__)
 
-pc = Pinecone(
-    api_key=config.PINECONE_API_KEY
-)
+DRIVE_SOURCE = 'google-drive'
+CAMPAIGN_SOURCE = 'database'
 
 openai = OpenAI(
-    api_key=config.OPENAI_API_KEY
+    api_key=config.OPENAI_API_KEY,
+    base_url=config.OPENAI_BASE_URL,
 )
 
 
-def create_embedding(text: str):
-    logger.debug("Generating embedding")
-    response = openai.embeddings.create(
-        model=config.EMBED_MODEL,
-        input=text
-    )
-    return response.data[0].embedding
+store = EmbeddingStore(config.EMBED_STORE_PATH, config.EMBED_DIMENSION) if config.EMBED_STORE_PATH else None
+
+batcher = EmbeddingBatcher(
+    openai,
+    config.EMBED_MODEL,
+    max_items=config.EMBED_BATCH_SIZE,
+    max_tokens=config.EMBED_BATCH_TOKENS,
+    store=store,
+)
 
 
-def sync_api_data(index_name: str, contexts: list[Tuple[str, str]]) -> None:
-    index = pc.Index(index_name)
+def upsert_vectors(index, vectors: list[dict], label: str, namespace: str = generations.DEFAULT_NAMESPACE) -> None:
+    total_batches = (len(vectors) + 99) // 100
+    for i in range(0, len(vectors), 100):
+        batch = vectors[i:i + 100]
+        current_batch = (i // 100) + 1
+        logger.debug(f"Upserting batch {current_batch}/{total_batches} for {label}")
+        index.upsert(vectors=batch, namespace=namespace)
 
-    logger.info("Starting API data synchronization")
 
+def embed_pending(pending: list[dict]) -> list[dict]:
+    """Batch-embed pending vectors ({'id', 'text', 'metadata'}) and attach their values."""
+    embeddings = batcher.embed((p['id'], p['text']) for p in pending)
+    return [
+        {'id': p['id'], 'values': embeddings[p['id']], 'metadata': p['metadata']}
+        for p in pending
+        if p['id'] in embeddings
+    ]
+
+
+def fetch_campaign_contexts() -> list[Tuple[str, str]]:
+    """Fetch the Friday campaigns, refresh the structured campaign table, and return them as prose contexts."""
+    response = friday.fetch_ai_response()
+    try:
+        campaigns.sync_campaigns(friday.parse_campaigns(response))
+    except Exception as e:
+        # The vector sync is still worth doing; the fast path keeps serving the previous rows
+        logger.error(f"Failed to store structured campaigns: {str(e)}", exc_info=True)
+    return friday.parse_all_info_from_response(response)
+
+
+def campaign_vector_id(chunk: str) -> str:
+    # Keyed by content so an unchanged chunk keeps its id across runs and renames
+    return f"campaign-{hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:32]}"
+
+
+def prepare_campaigns(contexts: list[Tuple[str, str]]) -> list[dict]:
+    """Chunk campaign contexts into pending vectors with content-addressed ids."""
+    pending = {}
     for name, content in contexts:
+        logger.info(f"Processing context: {name}")
+        chunks = gdoc.split_text(content)
+        logger.info(f"Split context '{name}' into {len(chunks)} chunks")
+        for idx, chunk in enumerate(chunks):
+            vector_id = campaign_vector_id(chunk)
+            pending[vector_id] = {
+                'id': vector_id,
+                'text': chunk,
+                'metadata': {
+                    'text': chunk,
+                    'source': CAMPAIGN_SOURCE,
+                    'name': name,
+                    'chunk_num': idx
+                }
+            }
+    return list(pending.values())
+
+
+def campaign_record(pending: dict) -> dict:
+    return {
+        'key': pending['id'],
+        'name': pending['metadata']['name'],
+        'content_hash': pending['id'],
+        'chunk_count': 1,
+    }
+
+
+def build_api_vectors(contexts: list[Tuple[str, str]]) -> Tuple[list[dict], list[dict]]:
+    logger.info("Starting API data synchronization")
+    pending = prepare_campaigns(contexts)
+
+    try:
+        vectors = embed_pending(pending)
+        logger.info(f"Embedded {len(vectors)} chunks from {len(contexts)} contexts")
+    except Exception as e:
+        logger.error(f"Failed to embed API contexts: {str(e)}", exc_info=True)
+        return [], []
+
+    embedded = {v['id'] for v in vectors}
+    return vectors, [campaign_record(p) for p in pending if p['id'] in embedded]
+
+
+def prepare_file(file: dict, content: str) -> Tuple[list[dict], dict]:
+    """Chunk one exported Drive file; returns its pending vectors and manifest record."""
+    chunks = gdoc.split_text(content)
+    logger.info(f"Split {file['name']} into {len(chunks)} chunks")
+
+    file_id, file_name = file['id'], file['name']
+    pending = [
+        {
+            'id': f"{file_id}_{idx}",
+            'text': chunk,
+            'metadata': {
+                'text': chunk,
+                'source': DRIVE_SOURCE,
+                'file_id': file_id,
+                'file_name': file_name,
+                'chunk_num': idx
+            }
+        }
+        for idx, chunk in enumerate(chunks)
+    ]
+    # Native Google Docs carry no md5Checksum, so hash the exported text instead
+    record = {
+        'key': file_id,
+        'name': file_name,
+        'modified_time': file.get('modifiedTime'),
+        'content_hash': hashlib.sha256(content.encode('utf-8')).hexdigest(),
+        'chunk_count': len(chunks),
+    }
+    return pending, record
+
+
+def export_and_embed(files: list[dict], needs_embedding=None) -> Tuple[dict, dict]:
+    """
+    Export files on a bounded thread pool and chunk/embed them as each
+    download lands, so embedding overlaps with the exports still in flight.
+    needs_embedding(record) can veto embedding a file whose content is
+    already indexed. Returns ({file_id: (pending, record)}, {vector_id:
+    vector}).
+    """
+    prepared, vectors, buffer = {}, {}, []
+
+    def flush():
         try:
-            logger.info(f"Processing context: {name}")
-            chunks = gdoc.split_text(content)
-            logger.info(f"Split context '{name}' into {len(chunks)} chunks")
-            vectors = []
-            for idx, chunk in enumerate(chunks):
-                vectors.append({
-                    'id': f"{name}_{idx}",
-                    'values': create_embedding(chunk),
-                    'metadata': {
-                        'text': chunk,
-                        'source': 'database',
-                        'name': name,
-                        'chunk_num': idx
-                    }
-                })
-
-                if (idx + 1) % 10 == 0:
-                    logger.debug(f"Processed {idx + 1}/{len(chunks)} chunks for context '{name}'")
-            # Batch upsert
-            total_batches = (len(vectors) + 99) // 100
-            for i in range(0, len(vectors), 100):
-                batch = vectors[i:i + 100]
-                current_batch = (i // 100) + 1
-                logger.debug(f"Upserting batch {current_batch}/{total_batches} for context '{name}'")
-                index.upsert(vectors=batch)
-
-            logger.info(f"Successfully indexed context '{name}'")
+            vectors.update((v['id'], v) for v in embed_pending(buffer))
+        except Exception as e:
+            logger.error(f"Failed to embed {len(buffer)} document chunks: {str(e)}", exc_info=True)
+        buffer.clear()
 
+    for file, content, error in gdoc.export_files(files):
+        if error is not None:
+            logger.error(f"Failed to export {file['name']}: {str(error)}")
+            continue
+        try:
+            file_pending, record = prepare_file(file, content)
         except Exception as e:
-            logger.error(f"Failed to process context {name}: {str(e)}", exc_info=True)
+            logger.error(f"Failed to process {file['name']}: {str(e)}", exc_info=True)
+            continue
 
+        prepared[file['id']] = (file_pending, record)
+        if needs_embedding is None or needs_embedding(record):
+            buffer.extend(file_pending)
+        if len(buffer) >= config.EMBED_BATCH_SIZE:
+            flush()
 
+    if buffer:
+        flush()
+    return prepared, vectors
 
-def sync_docs_data(index_name: str) -> None:
-    index = pc.Index(index_name)
 
+def build_docs_vectors() -> Tuple[list[dict], list[dict]]:
+    """Embed every Drive file; returns the vectors and manifest records of fully embedded files."""
     logger.info("Starting document processing")
     files = gdoc.list_drive_files()
 
-    for file in files:
+    start_time = time.time()
+    prepared, embedded = export_and_embed(files)
+    elapsed_time = time.time() - start_time
+    logger.info(f"Embedded {len(embedded)} chunks from {len(prepared)}/{len(files)} files in {elapsed_time:.2f} seconds")
+
+    # Files with missing chunks stay out of the manifest so the next sync retries them
+    vectors, records = [], []
+    for file_pending, record in prepared.values():
+        vectors.extend(embedded[p['id']] for p in file_pending if p['id'] in embedded)
+        if all(p['id'] in embedded for p in file_pending):
+            records.append(record)
+    return vectors, records
+
+
+def build_vectors() -> Tuple[list[dict], dict]:
+    """
+    Fetch, chunk and embed every source once; the result is staged in
+    memory for all targets. Returns the vectors and the manifest records
+    ({source: [record, ...]}) describing them.
+    """
+    contexts = fetch_campaign_contexts()
+    api_vectors, api_records = build_api_vectors(contexts)
+    docs_vectors, docs_records = build_docs_vectors()
+    vectors = api_vectors + docs_vectors
+
+    if store is not None:
+        # A full build references every live chunk, so anything else of this model is garbage
+        referenced = {store.make_key(v['metadata']['text'], config.EMBED_MODEL) for v in vectors}
         try:
-            logger.info(f"Processing file: {file['name']} (ID: {file['id']})")
-            content = gdoc.extract_doc_text(file['id'])
-
-            chunks = gdoc.split_text(content)
-            logger.info(f"Split {file['name']} into {len(chunks)} chunks")
-
-            file_id, file_name = file['id'], file['name']
-
-            start_time = time.time()
-            logger.info(f"Processing {len(chunks)} chunks for file: {file_name}")
-
-            vectors = []
-
-            for idx, chunk in enumerate(chunks):
-                vectors.append({
-                    'id': f"{file_id}_{idx}",
-                    'values': create_embedding(chunk),
-                    'metadata': {
-                        'text': chunk,
-                        'source': 'google-drive',
-                        'file_id': file_id,
-                        'file_name': file_name,
-                        'chunk_num': idx
-                    }
-                })
-
-                if (idx + 1) % 10 == 0:
-                    logger.debug(f"Processed {idx + 1}/{len(chunks)} chunks")
-
-            # Batch upsert
-            total_batches = (len(vectors) + 99) // 100
-            for i in range(0, len(vectors), 100):
-                batch = vectors[i:i + 100]
-                current_batch = (i // 100) + 1
-                logger.debug(f"Upserting batch {current_batch}/{total_batches}")
-                index.upsert(vectors=batch)
-
-            elapsed_time = time.time() - start_time
-            logger.info(f"Completed processing {file_name} in {elapsed_time:.2f} seconds")
-            logger.info(f"Successfully indexed {file['name']}")
-
+            store.compact(config.EMBED_MODEL, referenced)
         except Exception as e:
-            logger.error(f"Failed to process {file['name']}: {str(e)}", exc_info=True)
+            logger.warning(f"Failed to compact embedding store: {str(e)}")
 
-@sync_blueprint.route('/sync', methods=['POST'])
-def handle_sync():
-    demo_index = config.DEMO_INDEX_NAME
-    actual_index = config.INDEX_NAME
+    return vectors, {CAMPAIGN_SOURCE: api_records, DRIVE_SOURCE: docs_records}
 
-    try:
-        if pc.has_index(demo_index):
-            logger.info(f"Deleting existing index '{demo_index}'")
-            pc.delete_index(demo_index)
 
-        logger.info(f"Creating new Pinecone index '{demo_index}'")
-        pc.create_index(demo_index, dimension=1536, metric="cosine", spec=ServerlessSpec(cloud="aws", region="us-east-1"))
+def ensure_index(index_name: str) -> None:
+    if not retriever.has_index(index_name):
+        logger.info(f"Creating new {config.RETRIEVER_BACKEND} index '{index_name}'")
+        retriever.create_index(index_name)
+
+
+def validate_generation(index, namespace: str, vectors: list[dict]) -> None:
+    """Raise unless the namespace holds every vector and answers a probe query."""
+    if not vectors:
+        raise ValueError("Refusing to activate an empty generation")
+
+    deadline = time.time() + config.GENERATION_VALIDATE_TIMEOUT
+    while True:
+        stats = index.describe_index_stats()
+        summary = (stats.namespaces or {}).get(namespace)
+        count = summary.vector_count if summary else 0
+        if count >= len(vectors):
+            break
+        if time.time() > deadline:
+            raise ValueError(f"Generation '{namespace}' has {count}/{len(vectors)} vectors")
+        time.sleep(2)
+
+    probe = vectors[0]
+    result = index.query(vector=probe['values'], top_k=5, namespace=namespace, include_metadata=False)
+    matches = getattr(result, "matches", []) or []
+    if probe['id'] not in {m.id for m in matches}:
+        raise ValueError(f"Probe query against generation '{namespace}' did not return '{probe['id']}'")
 
-        contexts = friday.get_ai_context()
-        sync_api_data(demo_index, contexts)
-        sync_docs_data(demo_index)
-    except Exception as e:
-        logger.error(f"Failed to sync demo index: {str(e)}", exc_info=True)
-        return {"status": "error", "message": f"Demo index sync failed: {str(e)}"}, 500
+
+def prune_generations(index, index_name: str) -> None:
+    """Drop every generation except the active one and the one kept for rollback."""
+    keep = generations.retained_namespaces(index_name)
+    stats = index.describe_index_stats()
+    for namespace in (stats.namespaces or {}):
+        if namespace in keep:
+            continue
+        logger.info(f"Deleting old generation '{namespace}' from '{index_name}'")
+        index.delete(delete_all=True, namespace=namespace)
+
+
+def publish(index_name: str, vectors: list[dict], records: dict) -> None:
+    """Build a fresh generation of index_name, validate it, then flip readers over to it."""
+    ensure_index(index_name)
+    index = retriever.get_index(index_name)
+
+    namespace = generations.new_namespace()
+    logger.info(f"Building generation '{namespace}' of '{index_name}'")
+    upsert_vectors(index, vectors, index_name, namespace=namespace)
 
     try:
-        if pc.has_index(actual_index):
-            logger.info(f"Deleting existing index '{actual_index}'")
-            pc.delete_index(actual_index)
+        validate_generation(index, namespace, vectors)
+    except Exception:
+        index.delete(delete_all=True, namespace=namespace)
+        raise
 
-        logger.info(f"Creating new Pinecone index '{actual_index}'")
-        pc.create_index(actual_index, dimension=1536, metric="cosine", spec=ServerlessSpec(cloud="aws", region="us-east-1"))
+    generations.activate(index_name, namespace)
+    manifest.replace_generation(index_name, namespace, records)
+    logger.info(f"Published {len(vectors)} vectors to '{index_name}'")
 
-        contexts = friday.get_ai_context()
-        sync_api_data(actual_index, contexts)
-        sync_docs_data(actual_index)
+    try:
+        prune_generations(index, index_name)
+        manifest.prune(index_name, generations.retained_namespaces(index_name))
     except Exception as e:
-        logger.error(f"Failed to sync actual index: {str(e)}", exc_info=True)
-        return {"status": "error", "message": f"Actual index sync failed: {str(e)}"}, 500
+        logger.warning(f"Failed to prune old generations of '{index_name}': {str(e)}")
+
+
+def delete_vectors(index, ids: list[str], namespace: str) -> None:
+    for i in range(0, len(ids), 1000):
+        index.delete(ids=ids[i:i + 1000], namespace=namespace)
+
+
+def can_sync_incrementally(index_name: str) -> bool:
+    """Incremental sync needs a live generation whose contents are recorded in the manifest."""
+    if not retriever.has_index(index_name):
+        return False
+    namespace = generations.active_namespace(index_name, use_cache=False)
+    if not manifest.has_generation(index_name, namespace):
+        return False
+    # The manifest can outlive the vectors, e.g. after switching RETRIEVER_BACKEND
+    stats = retriever.get_index(index_name).describe_index_stats()
+    return namespace in (stats.namespaces or {})
+
+
+def apply_docs_changes(index_name: str, files: list[dict], prepared: dict, vectors: dict) -> None:
+    """
+    Bring the live generation of index_name in line with the Drive
+    listing: upsert changed files, trim chunks that no longer exist and
+    drop removed files.
+    """
+    namespace = generations.active_namespace(index_name, use_cache=False)
+    previous = manifest.load(index_name, namespace, DRIVE_SOURCE)
+    index = retriever.get_index(index_name)
+
+    listed = {file['id'] for file in files}
+    upserts, deletes = [], []
+    for file_id, (file_pending, record) in prepared.items():
+        old = previous.get(file_id)
+        if old and old['content_hash'] == record['content_hash']:
+            # Touched but not changed, only remember the new modifiedTime
+            manifest.upsert(index_name, namespace, DRIVE_SOURCE, record)
+            continue
+
+        file_vectors = [vectors[p['id']] for p in file_pending if p['id'] in vectors]
+        if len(file_vectors) < len(file_pending):
+            logger.error(f"Skipping {record['name']} for '{index_name}': not all chunks were embedded")
+            continue
+
+        upserts.extend(file_vectors)
+        if old:
+            deletes.extend(f"{file_id}_{idx}" for idx in range(record['chunk_count'], old['chunk_count']))
+        manifest.upsert(index_name, namespace, DRIVE_SOURCE, record)
+
+    removed = [file_id for file_id in previous if file_id not in listed]
+    for file_id in removed:
+        deletes.extend(f"{file_id}_{idx}" for idx in range(previous[file_id]['chunk_count']))
+    manifest.remove(index_name, namespace, DRIVE_SOURCE, removed)
+
+    upsert_vectors(index, upserts, index_name, namespace=namespace)
+    delete_vectors(index, deletes, namespace)
+    # Only record the new state once the index has accepted it
+    manifest.commit()
+    logger.info(
+        f"Incremental sync of '{index_name}': {len(upserts)} chunks upserted, "
+        f"{len(deletes)} deleted, {len(removed)} files removed"
+    )
 
-    return {"status": "success", "message": "Data synchronized successfully"}, 200
\ No newline at end of file
+
+def apply_campaign_changes(index_name: str, pending: list[dict], vectors: dict) -> None:
+    """Upsert campaign chunks the live generation lacks and bulk-delete ones that vanished."""
+    namespace = generations.active_namespace(index_name, use_cache=False)
+    previous = manifest.load(index_name, namespace, CAMPAIGN_SOURCE)
+    index = retriever.get_index(index_name)
+
+    current = {p['id']: p for p in pending}
+    upserts = []
+    for vector_id, p in current.items():
+        if vector_id in previous:
+            continue
+        if vector_id not in vectors:
+            logger.error(f"Skipping campaign chunk {vector_id} for '{index_name}': not embedded")
+            continue
+        upserts.append(vectors[vector_id])
+        manifest.upsert(index_name, namespace, CAMPAIGN_SOURCE, campaign_record(p))
+
+    vanished = [vector_id for vector_id in previous if vector_id not in current]
+    manifest.remove(index_name, namespace, CAMPAIGN_SOURCE, vanished)
+
+    upsert_vectors(index, upserts, index_name, namespace=namespace)
+    delete_vectors(index, vanished, namespace)
+    manifest.commit()
+    logger.info(
+        f"Campaign sync of '{index_name}': {len(upserts)} chunks upserted, {len(vanished)} deleted"
+    )
+
+
+def plan_docs(index_names: list[str]):
+    """List Drive, then export and embed (once for all targets) the files some target is missing."""
+    files = gdoc.list_drive_files()
+
+    previous = {
+        name: manifest.load(name, generations.active_namespace(name, use_cache=False), DRIVE_SOURCE)
+        for name in index_names
+    }
+    stale = [
+        file for file in files
+        if any(
+            file['id'] not in previous[name]
+            or previous[name][file['id']]['modified_time'] != file.get('modifiedTime')
+            for name in index_names
+        )
+    ]
+    logger.info(f"{len(stale)}/{len(files)} Drive files are new or modified")
+
+    def needs_embedding(record):
+        return any(
+            previous[name].get(record['key'], {}).get('content_hash') != record['content_hash']
+            for name in index_names
+        )
+
+    prepared, vectors = export_and_embed(stale, needs_embedding)
+    return files, prepared, vectors
+
+
+def plan_campaigns(index_names: list[str]):
+    """Chunk the current campaigns and embed (once for all targets) chunks some target is missing."""
+    # A failed fetch must abort rather than look like every campaign was removed
+    pending = prepare_campaigns(fetch_campaign_contexts())
+
+    previous = {
+        name: manifest.load(name, generations.active_namespace(name, use_cache=False), CAMPAIGN_SOURCE)
+        for name in index_names
+    }
+    new = [p for p in pending if any(p['id'] not in previous[name] for name in index_names)]
+    logger.info(f"{len(new)}/{len(pending)} campaign chunks are new")
+    vectors = {v['id']: v for v in embed_pending(new)}
+    return pending, vectors
+
+
+def sync_incremental(app, index_names: list[str], sources: list[str]) -> dict:
+    """
+    Reprocess only Drive files and campaign chunks that are new or changed
+    since each index's last sync. Changes are embedded once and applied to
+    every target. Returns {index_name: error message} for targets that
+    failed.
+    """
+    docs_plan = plan_docs(index_names) if DRIVE_SOURCE in sources else None
+    campaigns_plan = plan_campaigns(index_names) if CAMPAIGN_SOURCE in sources else None
+
+    def apply(name):
+        with app.app_context():
+            if docs_plan is not None:
+                apply_docs_changes(name, *docs_plan)
+            if campaigns_plan is not None:
+                apply_campaign_changes(name, *campaigns_plan)
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=len(index_names)) as executor:
+        futures = {executor.submit(apply, name): name for name in index_names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to sync index '{name}': {str(e)}", exc_info=True)
+                errors[name] = str(e)
+    return errors
+
+
+def _in_app_context(app, func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+SYNC_TARGETS = {
+    "demo": [config.DEMO_INDEX_NAME],
+    "production": [config.INDEX_NAME],
+    "all": [config.DEMO_INDEX_NAME, config.INDEX_NAME],
+}
+
+SYNC_SOURCES = {
+    "campaigns": [CAMPAIGN_SOURCE],
+    "docs": [DRIVE_SOURCE],
+    "all": [CAMPAIGN_SOURCE, DRIVE_SOURCE],
+}
+
+
+@sync_blueprint.route('/sync', methods=['POST'])
+@sync_key_required
+def handle_sync():
+    target = request.args.get("target", "all")
+    index_names = SYNC_TARGETS.get(target)
+    if index_names is None:
+        return {"status": "error", "message": f"Unknown sync target '{target}'"}, 400
+
+    mode = request.args.get("mode", "incremental")
+    if mode not in ("incremental", "full"):
+        return {"status": "error", "message": f"Unknown sync mode '{mode}'"}, 400
+
+    source = request.args.get("source", "all")
+    sources = SYNC_SOURCES.get(source)
+    if sources is None:
+        return {"status": "error", "message": f"Unknown sync source '{source}'"}, 400
+    if mode == "full" and source != "all":
+        return {"status": "error", "message": "A full rebuild always covers every source"}, 400
+
+    app = current_app._get_current_object()
+    errors = {}
+
+    if mode == "incremental":
+        incremental_names = [name for name in index_names if can_sync_incrementally(name)]
+        # A target without a manifest for its live generation needs one full rebuild first
+        full_names = [name for name in index_names if name not in incremental_names]
+        if incremental_names:
+            try:
+                errors.update(sync_incremental(app, incremental_names, sources))
+            except Exception as e:
+                logger.error(f"Incremental sync failed: {str(e)}", exc_info=True)
+                return {"status": "error", "message": f"Sync failed: {str(e)}"}, 500
+    else:
+        full_names = index_names
+
+    if full_names:
+        logger.info(f"Running full rebuild for {', '.join(full_names)}")
+        try:
+            vectors, records = build_vectors()
+        except Exception as e:
+            logger.error(f"Failed to build vectors: {str(e)}", exc_info=True)
+            return {"status": "error", "message": f"Sync failed: {str(e)}"}, 500
+
+        with ThreadPoolExecutor(max_workers=len(full_names)) as executor:
+            futures = {
+                executor.submit(_in_app_context, app, publish, name, vectors, records): name
+                for name in full_names
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Failed to sync index '{name}': {str(e)}", exc_info=True)
+                    errors[name] = str(e)
+
+    if errors:
+        failed = ", ".join(f"{name}: {error}" for name, error in errors.items())
+        return {"status": "error", "message": f"Index sync failed ({failed})"}, 500
+
+    return {"status": "success", "message": "Data synchronized successfully"}, 200
+
+
+@sync_blueprint.route('/sync/rollback', methods=['POST'])
+@sync_key_required
+def handle_rollback():
+    target = request.args.get("target", "all")
+    index_names = SYNC_TARGETS.get(target)
+    if index_names is None:
+        return {"status": "error", "message": f"Unknown sync target '{target}'"}, 400
+
+    restored = {name: generations.rollback(name) for name in index_names}
+    missing = [name for name, namespace in restored.items() if namespace is None]
+    if missing:
+        return {"status": "error", "message": f"No previous generation for {', '.join(missing)}"}, 409
+
+    return {"status": "success", "message": "Rolled back", "generations": restored}, 200
@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
 import logging
+from app.utils import campaigns
+from app.utils import ingest
+from app.utils import intents
+from app.utils import outbox
+from app.utils import pipeline
 from app.utils import whatsapp
 from app.utils.decorators import whatsapp_signature_required
-import json
+from app.extensions import message_workers
 
 import config
 
@@ -34,29 +39,73 @@ def webhook_get():
 @whatsapp_blueprint.route('/whatsapp/webhook', methods=['POST'])
 @whatsapp_signature_required
 def whatsapp_webhook_post():
-    body = request.get_json()
-    # logging.info(f"request body: {body}")
-
-    # Check if it's a WhatsApp status update
-    if (
-        body.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-        .get("statuses")
-    ):
-        logging.info("Received a WhatsApp status update.")
-        return jsonify({"status": "ok"}), 200
-
+    # The signature was checked against these same bytes; parse them exactly once
     try:
-        if whatsapp.is_valid_whatsapp_message(body):
-            whatsapp.process_whatsapp_message(body)
-            return jsonify({"status": "ok"}), 200
-        else:
-            # if the request is not a WhatsApp API event, return an error
-            return (
-                jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
-                404,
-            )
-    except json.JSONDecodeError:
+        body = ingest.load_payload(request.get_data(cache=True))
+    except ValueError:
         logging.error("Failed to decode JSON")
         return jsonify({"status": "error", "message": "Invalid JSON provided"}), 400
+
+    events = ingest.parse_events(body)
+    if not events:
+        # if the request is not a WhatsApp API event, return an error
+        return (
+            jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
+            404,
+        )
+
+    # Re-deliveries are acknowledged without doing any work; id-less events cannot be told apart
+    messages = [
+        e for e in events
+        if isinstance(e, ingest.MessageEvent)
+        and (e.message_id is None or whatsapp.recent_message_ids.add(e.message_id))
+    ]
+    statuses = [e for e in events if isinstance(e, ingest.StatusEvent)]
+    for status in statuses:
+        logging.info(f"Received a WhatsApp status update: {status.message_id} {status.status}")
+        if config.OUTBOX_ENABLED:
+            try:
+                outbox.sender.record_status(status)
+            except Exception as e:
+                logging.error(f"Failed to record status for {status.message_id}: {str(e)}")
+
+    if config.PIPELINE_ASYNC or config.WEBHOOK_ASYNC:
+        for i, event in enumerate(messages):
+            if config.PIPELINE_ASYNC:
+                submitted = pipeline.pipeline.submit(event)
+            else:
+                submitted = message_workers.submit(event.wa_id, event)
+            if not submitted:
+                # Let Meta retry later instead of blocking this thread; the retry must not look like a duplicate
+                forget_message_ids(messages[i:])
+                return jsonify({"status": "error", "message": "Busy"}), 503
+        return jsonify({"status": "ok"}), 200
+
+    for i, event in enumerate(messages):
+        try:
+            whatsapp.process_message_event(event)
+        except Exception:
+            forget_message_ids(messages[i:])
+            raise
+    return jsonify({"status": "ok"}), 200
+
+
+def forget_message_ids(events: list):
+    for event in events:
+        if event.message_id is not None:
+            whatsapp.recent_message_ids.discard(event.message_id)
+
+
+@whatsapp_blueprint.route('/whatsapp/workers', methods=['GET'])
+def workers_stats():
+    return jsonify(message_workers.stats()), 200
+
+
+@whatsapp_blueprint.route('/whatsapp/intents', methods=['GET'])
+def intents_stats():
+    return jsonify({**intents.stats(), "campaign_lookup": campaigns.stats()}), 200
+
+
+@whatsapp_blueprint.route('/whatsapp/outbox', methods=['GET'])
+def outbox_stats():
+    return jsonify(outbox.sender.stats()), 200
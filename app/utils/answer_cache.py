@@ -0,0 +1,113 @@
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def context_fingerprint(matches: list, system_prompt: str, model: str, extra_context: str = None) -> str:
+    """
+    Identify the exact context an answer was generated from: the retrieved
+    chunks (id and text, since Drive chunk ids survive edits), any context
+    added to them, the prompt template and the model. A sync that changes
+    any of them changes the fingerprint, so stale answers are never served.
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(system_prompt.encode("utf-8"))
+    for m in sorted(matches, key=lambda m: m.id):
+        text = (m.metadata or {}).get("text") or ""
+        digest.update(f"\0{m.id}\0{text}".encode("utf-8"))
+    if extra_context:
+        digest.update(f"\0\0{extra_context}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers.
+
+    Entries are bucketed by context fingerprint; within a bucket a stored
+    answer is returned when the cosine similarity between its query
+    embedding and the new one reaches threshold. Entries expire after ttl
+    seconds and the least recently used are evicted beyond max_size.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: int = 3600, max_size: int = 2000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self._buckets: dict[str, OrderedDict] = {}
+        self._lru: OrderedDict[int, str] = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id: int, fingerprint: str):
+        bucket = self._buckets.get(fingerprint)
+        if bucket is not None:
+            bucket.pop(entry_id, None)
+            if not bucket:
+                del self._buckets[fingerprint]
+        self._lru.pop(entry_id, None)
+
+    def lookup(self, embedding, fingerprint: str):
+        """Return a cached answer for a similar query over the same context, or None."""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(fingerprint)
+            if bucket:
+                for entry_id, (_, _, created) in list(bucket.items()):
+                    if now - created > self.ttl:
+                        self._remove(entry_id, fingerprint)
+
+            bucket = self._buckets.get(fingerprint)
+            if bucket:
+                entry_ids = list(bucket)
+                scores = np.stack([bucket[i][0] for i in entry_ids]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = entry_ids[best]
+                    self._lru.move_to_end(entry_id)
+                    self.hits += 1
+                    return bucket[entry_id][1]
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding, fingerprint: str, answer: str):
+        with self._lock:
+            entry_id = next(self._ids)
+            self._buckets.setdefault(fingerprint, OrderedDict())[entry_id] = (
+                self._normalize(embedding), answer, time.monotonic()
+            )
+            self._lru[entry_id] = fingerprint
+            while len(self._lru) > self.max_size:
+                oldest_id, oldest_fingerprint = next(iter(self._lru.items()))
+                self._remove(oldest_id, oldest_fingerprint)
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._lru),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,288 @@
+import calendar
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Optional
+
+import config
+from app.extensions import db
+from app.models import Campaign
+
+logger = logging.getLogger(__name__)
+
+_CAMPAIGN_WORDS = re.compile(r"\b(campaigns?|kempen|kampen|iklan|sticker|wrap|brand|jenama)\b")
+_PAY_WORDS = re.compile(r"\b(bayaran|bayar|gaji|pay(?:ment)?|earn|dapat\s+berapa|berapa\s+(?:rm|ringgit|duit)|rm\s*\d*)\b")
+_CURRENT_WORDS = re.compile(r"\b(bulan\s+ni|bulan\s+ini|this\s+month|sekarang|now|current|terkini|latest)\b")
+# "Campaign apa ada", "list of campaigns": asks for the campaigns themselves
+_LISTING_WORDS = re.compile(
+    r"\b(?:senarai|list|apa|which|what|any|ada)\s+(?:\w+\s+){0,2}?(?:campaigns?|kempen|kampen)\b"
+    r"|\b(?:campaigns?|kempen|kampen)\s+(?:apa|mana|yang\s+ada|available|tersedia|terbuka|open)\b"
+)
+# "Berapa bayaran", "how much does it pay": asks for the rates themselves
+_RATE_WORDS = re.compile(
+    r"\b(how\s+much|berapa(?!\s+lama)|brp|rate|kadar|pay\s+per\s+month|(?:bayaran|gaji)\s+(?:sebulan|bulanan))\b"
+)
+# Process questions ("macam mana nak join campaign") need the docs, not the campaign table
+_PROCESS_WORDS = re.compile(
+    r"\b(macam\s*mana|camne|cmne|cara|how(?!\s+much)|kenapa|why|apply|daftar|register|join|syarat|requirements?)\b"
+)
+_NUMBER = re.compile(r"-?\d+(?:[.,]\d+)*")
+_SPLIT = re.compile(r"\s*(?:,|/|&|\band\b|\bdan\b)\s*")
+
+# Local names for places as Friday spells them
+LOCATION_ALIASES = {
+    "kl": "kuala lumpur",
+    "jb": "johor bahru",
+    "pulau pinang": "penang",
+    "pg": "penang",
+    "n9": "negeri sembilan",
+    "nogori": "negeri sembilan",
+    "kk": "kota kinabalu",
+}
+
+
+def normalize(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = re.sub(r"\s+", " ", str(value)).strip().lower()
+    return text or None
+
+
+def parse_date(value: Any) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)[:10]).date()
+    except ValueError:
+        return None
+
+
+def parse_number(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group(0).replace(",", "")) if match else None
+
+
+def sync_campaigns(items: list[dict]) -> int:
+    """Replace the campaign table with the current Friday campaigns; returns how many are stored."""
+    existing = {c.external_id: c for c in Campaign.query.all()}
+    seen = set()
+    for idx, item in enumerate(items, start=1):
+        external_id = str(item.get("id") or item.get("name") or f"campaign-{idx}")
+        if external_id in seen:
+            continue
+        seen.add(external_id)
+
+        campaign = existing.get(external_id)
+        if campaign is None:
+            campaign = Campaign(external_id=external_id)
+            db.session.add(campaign)
+        campaign.name = item.get("name") or external_id
+        campaign.description = item.get("description")
+        campaign.brand = item.get("brand_name")
+        campaign.location = item.get("location")
+        campaign.brand_key = normalize(campaign.brand)
+        campaign.location_key = normalize(campaign.location)
+        campaign.start_date = parse_date(item.get("start_date"))
+        campaign.end_date = parse_date(item.get("end_date"))
+        campaign.kilometers_per_month = parse_number(item.get("kilometers_per_month"))
+        campaign.pay_per_month = parse_number(item.get("pay_per_month"))
+        max_drivers = parse_number(item.get("max_drivers"))
+        campaign.max_drivers = int(max_drivers) if max_drivers is not None else None
+
+    for external_id, campaign in existing.items():
+        if external_id not in seen:
+            db.session.delete(campaign)
+    db.session.commit()
+    vocabulary.invalidate()
+    logger.info(f"Stored {len(seen)} campaigns ({len(set(existing) - seen)} removed)")
+    return len(seen)
+
+
+class Vocabulary:
+    """
+    Distinct location and brand keys in the campaign table, split into the
+    names a user would type ("Kuala Lumpur, Selangor" -> both), refreshed
+    every ttl seconds or after a sync in this process.
+    """
+
+    def __init__(self, ttl: int = 60):
+        self.ttl = ttl
+        self._loaded_at = None
+        self._locations: dict[str, set] = {}
+        self._brands: dict[str, set] = {}
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    @staticmethod
+    def _index(keys) -> dict:
+        index = {}
+        for key in keys:
+            if not key:
+                continue
+            for part in [key, *_SPLIT.split(key)]:
+                if part:
+                    index.setdefault(part, set()).add(key)
+        return index
+
+    def get(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                rows = db.session.query(Campaign.location_key, Campaign.brand_key).all()
+                self._locations = self._index(r.location_key for r in rows)
+                self._brands = self._index(r.brand_key for r in rows)
+                self.size = len(rows)
+                self._loaded_at = time.monotonic()
+            return self._locations, self._brands
+
+
+vocabulary = Vocabulary(ttl=config.CAMPAIGN_VOCAB_SECONDS)
+
+
+def _mentioned(text: str, index: dict) -> set:
+    keys = set()
+    for name, matching_keys in index.items():
+        if re.search(rf"\b{re.escape(name)}\b", text):
+            keys.update(matching_keys)
+    return keys
+
+
+@dataclass
+class CampaignQuery:
+    locations: set = field(default_factory=set)
+    brands: set = field(default_factory=set)
+    this_month: bool = False
+    listing: bool = False
+    rates: bool = False
+
+    @property
+    def filtered(self) -> bool:
+        return bool(self.locations or self.brands or self.this_month)
+
+    @property
+    def exclusive(self) -> bool:
+        """
+        The table alone answers it: a listing, or a question about rates for
+        a location, brand or month. A filter on its own ("sticker shopee saya
+        tertanggal") is a support question that only mentions a campaign.
+        """
+        return self.listing or (self.rates and self.filtered)
+
+
+def parse_query(message: str) -> Optional[CampaignQuery]:
+    """A CampaignQuery if message is a factual question about campaigns or pay, else None."""
+    text = normalize(message) or ""
+    if not (_CAMPAIGN_WORDS.search(text) or _PAY_WORDS.search(text)) or _PROCESS_WORDS.search(text):
+        return None
+
+    for alias, name in LOCATION_ALIASES.items():
+        text = re.sub(rf"\b{re.escape(alias)}\b", name, text)
+    locations, brands = vocabulary.get()
+    if not vocabulary.size:
+        # Nothing synced yet; an empty table must not read as "no campaigns"
+        return None
+    return CampaignQuery(
+        locations=_mentioned(text, locations),
+        brands=_mentioned(text, brands),
+        this_month=bool(_CURRENT_WORDS.search(text)),
+        listing=bool(_LISTING_WORDS.search(text)),
+        rates=bool(_RATE_WORDS.search(text)),
+    )
+
+
+def lookup(query: CampaignQuery, today: date = None, limit: int = 10) -> list:
+    today = today or date.today()
+    q = Campaign.query
+    if query.locations:
+        q = q.filter(Campaign.location_key.in_(query.locations))
+    if query.brands:
+        q = q.filter(Campaign.brand_key.in_(query.brands))
+
+    if query.this_month:
+        month_start = today.replace(day=1)
+        month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+        q = q.filter(db.or_(Campaign.start_date.is_(None), Campaign.start_date <= month_end))
+        q = q.filter(db.or_(Campaign.end_date.is_(None), Campaign.end_date >= month_start))
+    else:
+        # Anything not over yet, including upcoming campaigns
+        q = q.filter(db.or_(Campaign.end_date.is_(None), Campaign.end_date >= today))
+
+    return q.order_by(Campaign.start_date, Campaign.name).limit(limit).all()
+
+
+def _fmt_number(value: Optional[float]) -> str:
+    if value is None:
+        return "?"
+    return f"{value:,.0f}" if value == int(value) else f"{value:,.2f}"
+
+
+def format_context(query: CampaignQuery, campaigns: list) -> str:
+    """Compact, exact context for the model from structured campaign rows."""
+    filters = []
+    if query.locations:
+        filters.append(f"location: {', '.join(sorted(query.locations))}")
+    if query.brands:
+        filters.append(f"brand: {', '.join(sorted(query.brands))}")
+    filters.append("running this month" if query.this_month else "not yet ended")
+    header = f"Campaigns from the Carching database as of {date.today().isoformat()} ({'; '.join(filters)}):"
+
+    if not campaigns:
+        return f"{header}\nNo campaigns match."
+
+    lines = [header]
+    for c in campaigns:
+        dates = f"{c.start_date.isoformat() if c.start_date else '?'} to {c.end_date.isoformat() if c.end_date else '?'}"
+        lines.append(
+            f"- {c.name} | Brand: {c.brand or '?'} | Location: {c.location or '?'} | {dates} | "
+            f"Pay per month: RM{_fmt_number(c.pay_per_month)} | "
+            f"Kilometers per month: {_fmt_number(c.kilometers_per_month)} | "
+            f"Max drivers: {_fmt_number(c.max_drivers)}"
+        )
+    return "\n".join(lines)
+
+
+_lock = threading.Lock()
+_counts = {"fast_path": 0, "supplemented": 0, "no_match": 0, "skipped": 0}
+
+
+def fast_context(message: str) -> tuple[Optional[str], bool]:
+    """
+    Context for a campaign or pay question from the campaign table, and
+    whether it replaces retrieval. Listings and rate questions filtered by
+    location, brand or month are answered from the table alone; other
+    mentions ("payment saya bulan ni belum masuk") are support questions
+    for the docs, so the rows are only added to the retrieved context.
+    (None, False) when the message is not about campaigns.
+    """
+    query = parse_query(message)
+    if query is None:
+        with _lock:
+            _counts["skipped"] += 1
+        return None, False
+
+    campaigns = lookup(query, limit=config.CAMPAIGN_FAST_PATH_LIMIT)
+    with _lock:
+        _counts["fast_path" if query.exclusive else "supplemented"] += 1
+        if not campaigns:
+            _counts["no_match"] += 1
+    if not query.exclusive and not campaigns:
+        return None, False
+    logger.info(
+        f"{'Answering from' if query.exclusive else 'Adding'} {len(campaigns)} structured campaigns: {query}"
+    )
+    return format_context(query, campaigns), query.exclusive
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counts)
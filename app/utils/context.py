@@ -0,0 +1,118 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from app.utils.embedding_batcher import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - falls back to a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n---\n\n"
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Models newer than the installed tiktoken; every current chat model uses one of these
+            return tiktoken.get_encoding("o200k_base" if model.startswith(("gpt-4o", "gpt-5", "o")) else "cl100k_base")
+    except Exception as e:
+        # tiktoken downloads encodings on first use; without network, estimate instead of failing replies
+        logger.warning(f"Failed to load tiktoken encoding for {model}, estimating tokens: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens text costs in a prompt for model (estimated when tiktoken is unavailable)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def shingles(text: str, size: int = 5) -> frozenset:
+    """Set of lower-cased word size-grams, for near-duplicate detection."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    used: list = field(default_factory=list)
+    tokens: int = 0
+    duplicates: int = 0
+    over_budget: int = 0
+
+
+def format_snippet(match) -> str:
+    meta = match.metadata or {}
+    text = meta.get("text") or ""
+    file_name = meta.get("file_name", "")
+    chunk_num = meta.get("chunk_num")
+    header = f"Source: {file_name}" + (f" (chunk {chunk_num})" if chunk_num is not None else "")
+    return f"{header}\n{text}" if header.strip() else text
+
+
+def pack_context(matches: list, model: str, max_tokens: int, min_score: float = 0.0,
+                 dedup_threshold: float = 0.8) -> PackedContext:
+    """
+    Pack match texts, best score first, into at most max_tokens prompt tokens.
+
+    A chunk whose shingle overlap with an already packed chunk reaches
+    dedup_threshold is dropped (overlapping Drive chunks, a campaign that is
+    also described in a doc). A chunk that does not fit is skipped and
+    smaller, lower-ranked ones are still tried.
+    """
+    separator_tokens = count_tokens(SEPARATOR, model)
+    packed = PackedContext(text="")
+    snippets, seen = [], []
+
+    for m in matches:
+        score = getattr(m, "score", None)
+        if score is not None and score < min_score:
+            continue
+        text = (m.metadata or {}).get("text") or ""
+        if not text:
+            continue
+
+        grams = shingles(text)
+        if any(jaccard(grams, other) >= dedup_threshold for other in seen):
+            packed.duplicates += 1
+            continue
+
+        snippet = format_snippet(m)
+        cost = count_tokens(snippet, model) + (separator_tokens if snippets else 0)
+        if packed.tokens + cost > max_tokens:
+            packed.over_budget += 1
+            continue
+
+        snippets.append(snippet)
+        seen.append(grams)
+        packed.used.append(m)
+        packed.tokens += cost
+
+    packed.text = SEPARATOR.join(snippets)
+    logger.info(
+        f"Packed {len(packed.used)}/{len(matches)} chunks into {packed.tokens} tokens "
+        f"(budget {max_tokens}, {packed.duplicates} duplicates, {packed.over_budget} over budget)"
+    )
+    return packed
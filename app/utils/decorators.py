@@ -6,19 +6,20 @@ import hmac
 import config
 
 
-def validate_whatsapp_signature(payload, signature):
+def validate_whatsapp_signature(payload: bytes, signature):
     """
-    Validate the incoming payload's signature against our expected signature
+    Validate the incoming payload's signature against our expected signature.
+    Meta signs the raw body, so the bytes are hashed as received.
     """
     try:
         app_secret = config.WHATSAPP_APP_SECRET
         expected_signature = hmac.new(
             bytes(app_secret, "latin-1"),
-            msg=payload.encode("utf-8"),
+            msg=payload,
             digestmod=hashlib.sha256,
         ).hexdigest()
 
-        logging.debug(f"Payload: {payload[:100]}...")  # Log first 100 chars
+        logging.debug(f"Payload: {payload[:100]!r}...")  # Log first 100 bytes
         logging.debug(f"Expected signature: {expected_signature}")
         logging.debug(f"Received signature: {signature}")
 
@@ -28,6 +29,24 @@ def validate_whatsapp_signature(payload, signature):
         return False
 
 
+def sync_key_required(f):
+    """Reject requests without "Authorization: Bearer <SYNC_API_KEY>"."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not config.SYNC_API_KEY:
+            logging.error("SYNC_API_KEY is not set, refusing sync request")
+            return jsonify({"status": "error", "message": "Sync is not configured"}), 403
+
+        header = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(header.encode(), f"Bearer {config.SYNC_API_KEY}".encode()):
+            logging.error("Sync request with a missing or wrong key")
+            return jsonify({"status": "error", "message": "Invalid sync key"}), 403
+
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 def whatsapp_signature_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -39,7 +58,7 @@ def whatsapp_signature_required(f):
             return jsonify({"status": "error", "message": "Invalid signature format"}), 403
 
         signature = raw_signature[7:]  # Remove 'sha256='
-        if not validate_whatsapp_signature(request.data.decode("utf-8"), signature):
+        if not validate_whatsapp_signature(request.get_data(cache=True), signature):
             logging.error("Signature verification failed!")
             return jsonify({"status": "error", "message": "Invalid signature"}), 403
 
@@ -0,0 +1,49 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecentIds:
+    """
+    In-memory TTL set of recently seen WhatsApp message ids.
+
+    This is the fast path for webhook re-deliveries hitting the same process;
+    the unique wa_message_id column on WhatsappMessage catches the rest
+    (other nodes, restarts, entries that already expired here).
+    """
+
+    def __init__(self, ttl: int = 86400, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def add(self, message_id: str) -> bool:
+        """Record message_id; returns False if it was already seen within the TTL."""
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest_id, seen_at = next(iter(self._seen.items()))
+                if now - seen_at <= self.ttl and len(self._seen) < self.max_size:
+                    break
+                self._seen.popitem(last=False)
+
+            if message_id in self._seen:
+                self.duplicates += 1
+                return False
+            self._seen[message_id] = now
+            return True
+
+    def discard(self, message_id: str):
+        """Forget message_id, so a retry of a message that was not handled is processed."""
+        with self._lock:
+            self._seen.pop(message_id, None)
+
+    def count_duplicate(self):
+        with self._lock:
+            self.duplicates += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tracked": len(self._seen), "duplicates": self.duplicates}
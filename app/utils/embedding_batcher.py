@@ -0,0 +1,117 @@
+import logging
+import time
+from typing import Iterable, Tuple
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Conservative token estimate used for packing batches (about 3 chars per token)."""
+    return len(text) // 3 + 1
+
+
+class EmbeddingBatcher:
+    """
+    Packs (vector_id, text) pairs into as few embeddings requests as possible.
+
+    A batch is closed when it reaches max_items inputs or max_tokens
+    estimated tokens. Rate limits, connection errors, timeouts and 5xx are
+    retried with exponential backoff (the client's own retries are turned
+    off). A rejected request (400) is split in half so one bad input cannot
+    sink the rest. Authentication and permission errors abort the run. With
+    a store, texts embedded before are served from it and only new texts
+    reach the API.
+    """
+
+    def __init__(self, client, model: str, max_items: int = 100, max_tokens: int = 100000,
+                 max_retries: int = 3, backoff: float = 1.0, store=None):
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.store = store
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _batches(self, items: list[Tuple[str, str]]):
+        batch, tokens = [], 0
+        for item in items:
+            item_tokens = estimate_tokens(item[1])
+            if batch and (len(batch) >= self.max_items or tokens + item_tokens > self.max_tokens):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(item)
+            tokens += item_tokens
+        if batch:
+            yield batch
+
+    def _request(self, batch: list[Tuple[str, str]]) -> dict:
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=[text for _, text in batch]
+        )
+        # Results carry the position of their input, map them back to vector ids
+        return {batch[d.index][0]: d.embedding for d in response.data}
+
+    def _embed_batch(self, batch: list[Tuple[str, str]]) -> dict:
+        for attempt in range(self.max_retries):
+            try:
+                return self._request(batch)
+            except (openai.AuthenticationError, openai.PermissionDeniedError):
+                raise
+            except openai.BadRequestError as e:
+                return self._split(batch, e)
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+                # APITimeoutError is an APIConnectionError; InternalServerError covers every 5xx
+                logger.warning(
+                    f"Embedding batch of {len(batch)} failed (attempt {attempt + 1}/{self.max_retries}): {str(e)}"
+                )
+                if attempt + 1 < self.max_retries:
+                    time.sleep(self.backoff * (2 ** attempt))
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(batch)} failed, not retrying: {str(e)}")
+                return {}
+
+        logger.error(f"Giving up on embedding batch of {len(batch)} after {self.max_retries} attempts")
+        return {}
+
+    def _split(self, batch: list[Tuple[str, str]], error: Exception) -> dict:
+        """Bisect a rejected batch to isolate the inputs the API refuses."""
+        if len(batch) == 1:
+            logger.error(f"Giving up on embedding for '{batch[0][0]}': {str(error)}")
+            return {}
+
+        mid = len(batch) // 2
+        logger.warning(f"Splitting rejected embedding batch of {len(batch)}: {str(error)}")
+        result = self._embed_batch(batch[:mid])
+        result.update(self._embed_batch(batch[mid:]))
+        return result
+
+    def embed(self, items: Iterable[Tuple[str, str]]) -> dict:
+        """
+        Embed every (vector_id, text) pair. Returns {vector_id: embedding};
+        ids that could not be embedded are missing.
+        """
+        items = list(items)
+        embeddings = {}
+
+        missing = items
+        if self.store is not None:
+            keys = {vector_id: self.store.make_key(text, self.model) for vector_id, text in items}
+            stored = self.store.get_many(set(keys.values()))
+            embeddings = {vector_id: stored[key] for vector_id, key in keys.items() if key in stored}
+            missing = [item for item in items if item[0] not in embeddings]
+            logger.info(f"Embedding store served {len(embeddings)}/{len(items)} chunks")
+
+        for number, batch in enumerate(self._batches(missing), start=1):
+            logger.debug(f"Embedding batch {number} ({len(batch)} inputs)")
+            result = self._embed_batch(batch)
+            if self.store is not None and result:
+                self.store.put_many(self.model, {keys[vector_id]: vector for vector_id, vector in result.items()})
+            embeddings.update(result)
+
+        if len(embeddings) < len(items):
+            logger.error(f"Failed to embed {len(items) - len(embeddings)}/{len(items)} chunks")
+        return embeddings
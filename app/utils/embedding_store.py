@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows; a single process per store there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """
+    Content-addressed, on-disk store of document embeddings.
+
+    Vectors live in an append-only float32 matrix (vectors-N.f32) that is read
+    through a memory map; keys-N.txt holds one "model<TAB>key" line per row,
+    where key is sha256 of the model and chunk text. Rows are never updated
+    in place, compact() writes version N+1 without rows nobody references
+    and switches to it by atomically replacing the CURRENT file.
+
+    Processes sharing a path (the web app and scripts/sync.py) take an flock
+    on the LOCK file around every access and reload the key index when
+    another process has appended rows or compacted since.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._version = 0
+        self._lock = threading.Lock()
+        self._rows: dict[str, int] = {}
+        self._models: list[str] = []
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(path, exist_ok=True)
+        with self._file_lock():
+            self._load()
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, f"vectors-{self._version}.f32")
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.path, f"keys-{self._version}.txt")
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, "LOCK"), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _read_version(self) -> int:
+        current_path = os.path.join(self.path, "CURRENT")
+        if not os.path.exists(current_path):
+            return 0
+        with open(current_path, encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+
+    def _refresh(self):
+        """Reload if another process appended or compacted since; call with the file lock held."""
+        if self._read_version() == self._version:
+            vectors_path = self._vectors_path
+            size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+            if size == len(self._models) * self.dim * 4:
+                return
+        self._load()
+
+    def _load(self):
+        self._version = self._read_version()
+
+        keys = []
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, encoding="utf-8") as f:
+                keys = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+
+        row_bytes = self.dim * 4
+        stored_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+
+        # Vectors are written before keys, so after a crash keep only rows present in both files
+        rows = min(len(keys), stored_rows)
+        if rows < len(keys) or rows < stored_rows:
+            logger.warning(f"Embedding store at {self.path} was not closed cleanly, truncating to {rows} rows")
+            self._rewrite_keys(keys[:rows])
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(rows * row_bytes)
+
+        self._models = [model for model, _ in keys[:rows]]
+        self._rows = {key: row for row, (_, key) in enumerate(keys[:rows])}
+        self._matrix = None
+
+    def _rewrite_keys(self, keys: list, path: str = None):
+        path = path or self._keys_path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{model}\t{key}\n" for model, key in keys)
+        os.replace(tmp_path, path)
+
+    def _map(self):
+        rows = len(self._models)
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+        return self._matrix
+
+    def __len__(self):
+        return len(self._models)
+
+    def get_many(self, keys) -> dict:
+        """Return {key: embedding} for the keys that are stored."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            found = {key: self._rows[key] for key in keys if key in self._rows}
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+            if not found:
+                return {}
+            matrix = self._map()
+            return {key: matrix[row].tolist() for key, row in found.items()}
+
+    def put_many(self, model: str, embeddings: dict) -> None:
+        """Append {key: embedding} pairs that are not stored yet."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            new = [(key, vector) for key, vector in embeddings.items() if key not in self._rows]
+            if not new:
+                return
+
+            block = np.asarray([vector for _, vector in new], dtype=np.float32)
+            if block.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim embeddings, got {block.shape[1]}")
+
+            with open(self._vectors_path, "ab") as f:
+                f.write(block.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{model}\t{key}\n" for key, _ in new)
+
+            for key, _ in new:
+                self._rows[key] = len(self._models)
+                self._models.append(model)
+
+    def compact(self, model: str, referenced: set, min_garbage: float = 0.25) -> int:
+        """
+        Drop rows of model whose keys are not in referenced; rows of other
+        models are kept. Skipped unless at least min_garbage of all rows
+        would be freed. Returns rows removed.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            keep = [
+                (row, self._models[row], key)
+                for key, row in self._rows.items()
+                if self._models[row] != model or key in referenced
+            ]
+            removed = len(self._models) - len(keep)
+            if not removed or removed < min_garbage * len(self._models):
+                return 0
+
+            keep.sort()
+            matrix = self._map()
+            old_paths = (self._vectors_path, self._keys_path)
+            version = self._version + 1
+            with open(os.path.join(self.path, f"vectors-{version}.f32"), "wb") as f:
+                for start in range(0, len(keep), 1024):
+                    rows = [row for row, _, _ in keep[start:start + 1024]]
+                    f.write(np.ascontiguousarray(matrix[rows]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._rewrite_keys(
+                [(row_model, key) for _, row_model, key in keep],
+                os.path.join(self.path, f"keys-{version}.txt"),
+            )
+
+            # Switching CURRENT is the commit point; a crash before it leaves the old version intact
+            tmp_path = os.path.join(self.path, "CURRENT.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(version))
+            os.replace(tmp_path, os.path.join(self.path, "CURRENT"))
+
+            self._matrix = None
+            self._load()
+            for old_path in old_paths:
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+
+        logger.info(f"Compacted embedding store at {self.path}: removed {removed} rows, kept {len(keep)}")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rows": len(self._models), "hits": self.hits, "misses": self.misses}
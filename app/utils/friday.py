@@ -2,7 +2,7 @@
 from typing import Tuple, Any, List
 
 import config
-import requests
+from app.utils import http
 
 
 def _fmt(value: Any) -> str:
@@ -40,13 +40,16 @@ def parse_all_info_from_response(response_json) -> list[Tuple[str, str]]:
     return result
 
 
-def get_ai_context() -> list[Tuple[str, str]]:
+def parse_campaigns(response_json) -> list[dict]:
+    """The structured campaign records of an ai-context response."""
+    items = response_json.get("data", {}).get("campaigns", [])
+    return [item for item in items if isinstance(item, dict)]
+
+
+def fetch_ai_response() -> dict:
+    """Raw ai-context response; raises on failure."""
     url = f"{config.FRIDAY_API_URL}/api/ai-context"
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return parse_all_info_from_response(response.json())
-    except Exception as e:
-        # Log the error if logging is set up, or print for now
-        print(f"Error fetching AI context: {e}")
-        return []
\ No newline at end of file
+    response = http.get(url)
+    response.raise_for_status()
+    return response.json()
+
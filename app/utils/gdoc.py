@@ -1,4 +1,9 @@
 import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 
 import config
 from googleapiclient.discovery import build
@@ -6,23 +11,48 @@ from google.oauth2 import service_account
 
 logger = logging.getLogger(__name__)
 
-def get_drive_service():
-    logger.debug("Initializing Google Drive service")
-    creds = service_account.Credentials.from_service_account_file(
+_local = threading.local()
+
+
+@lru_cache(maxsize=1)
+def get_credentials():
+    logger.debug("Loading Google service account credentials")
+    return service_account.Credentials.from_service_account_file(
         config.SERVICE_ACCOUNT_FILE,
         scopes=['https://www.googleapis.com/auth/drive.readonly']
     )
-    return build('drive', 'v3', credentials=creds)
+
+
+def get_drive_service():
+    """
+    Drive client for the calling thread, built once and reused for every
+    later call. The underlying httplib2 transport is not thread-safe, so
+    each thread gets its own.
+    """
+    service = getattr(_local, "service", None)
+    if service is None:
+        logger.debug("Initializing Google Drive service")
+        service = build('drive', 'v3', credentials=get_credentials(), cache_discovery=False)
+        _local.service = service
+    return service
 
 
 def list_drive_files():
     logger.info("Fetching files from Google Drive folder")
     service = get_drive_service()
-    results = service.files().list(
-        q=f"'{config.GOOGLE_DRIVE_FOLDER_ID}' in parents and trashed = false",
-        fields="files(id, name, mimeType)"
-    ).execute()
-    files = results.get('files', [])
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=f"'{config.GOOGLE_DRIVE_FOLDER_ID}' in parents and trashed = false",
+            fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
+            pageSize=1000,
+            pageToken=page_token
+        ).execute(num_retries=config.DRIVE_NUM_RETRIES)
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
     logger.info(f"Found {len(files)} files in Drive folder")
     return files
 
@@ -33,9 +63,33 @@ def extract_doc_text(file_id: str) -> str:
     doc = service.files().export(
         fileId=file_id,
         mimeType='text/plain'
-    ).execute()
+    ).execute(num_retries=config.DRIVE_NUM_RETRIES)
     return doc.decode('utf-8')
 
+
+def _timed_export(file: dict) -> str:
+    start_time = time.time()
+    content = extract_doc_text(file['id'])
+    logger.info(f"Exported {file['name']} ({len(content)} chars) in {time.time() - start_time:.2f} seconds")
+    return content
+
+
+def export_files(files: list[dict], max_workers: int = None):
+    """
+    Export files concurrently, at most max_workers
+    (DRIVE_EXPORT_CONCURRENCY) at a time to stay within Drive quotas.
+    Yields (file, content, error) as each export finishes.
+    """
+    max_workers = max_workers or config.DRIVE_EXPORT_CONCURRENCY
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-export") as executor:
+        futures = {executor.submit(_timed_export, file): file for file in files}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                yield file, future.result(), None
+            except Exception as e:
+                yield file, None, e
+
 def split_text(text, max_words=120, min_words=30):
     """
     Smart text splitter that:
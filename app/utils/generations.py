@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+
+import config
+from app.extensions import db
+from app.models import IndexAlias
+
+logger = logging.getLogger(__name__)
+
+# The default namespace holds data written before versioned generations existed
+DEFAULT_NAMESPACE = ""
+
+_cache: dict[str, tuple[float, str]] = {}
+_lock = threading.Lock()
+
+
+def new_namespace() -> str:
+    return f"{config.GENERATION_PREFIX}{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+
+
+def active_namespace(index_name: str, use_cache: bool = True) -> str:
+    """
+    Namespace currently served for index_name. Cached for
+    GENERATION_CACHE_SECONDS, so a flip reaches every reader shortly after
+    it commits.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(index_name)
+        if use_cache and cached and now - cached[0] < config.GENERATION_CACHE_SECONDS:
+            return cached[1]
+
+    try:
+        alias = db.session.get(IndexAlias, index_name)
+        namespace = alias.active_namespace if alias else DEFAULT_NAMESPACE
+    except Exception as e:
+        logger.error(f"Failed to read active generation for '{index_name}': {str(e)}")
+        # Keep serving the last known generation rather than an empty namespace
+        return cached[1] if cached else DEFAULT_NAMESPACE
+
+    with _lock:
+        _cache[index_name] = (now, namespace)
+    return namespace
+
+
+def activate(index_name: str, namespace: str):
+    """Atomically make namespace the served generation; returns the one it replaced."""
+    alias = db.session.get(IndexAlias, index_name)
+    if alias is None:
+        alias = IndexAlias(index_name=index_name, active_namespace=namespace, previous_namespace=DEFAULT_NAMESPACE)
+        db.session.add(alias)
+    else:
+        alias.previous_namespace = alias.active_namespace
+        alias.active_namespace = namespace
+    db.session.commit()
+
+    with _lock:
+        _cache.pop(index_name, None)
+    logger.info(f"Index '{index_name}' now serving '{namespace}' (previous '{alias.previous_namespace}')")
+    return alias.previous_namespace
+
+
+def rollback(index_name: str):
+    """Swap the active and previous generations; returns the namespace now served, or None."""
+    alias = db.session.get(IndexAlias, index_name)
+    if alias is None or alias.previous_namespace is None:
+        return None
+
+    alias.active_namespace, alias.previous_namespace = alias.previous_namespace, alias.active_namespace
+    db.session.commit()
+
+    with _lock:
+        _cache.pop(index_name, None)
+    logger.info(f"Rolled back index '{index_name}' to '{alias.active_namespace}'")
+    return alias.active_namespace
+
+
+def retained_namespaces(index_name: str) -> set:
+    alias = db.session.get(IndexAlias, index_name)
+    if alias is None:
+        return {DEFAULT_NAMESPACE}
+    return {alias.active_namespace, alias.previous_namespace}
@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict, deque
+
+
+class HistoryCache:
+    """
+    Per-user ring buffer of the newest chat turns.
+
+    A user's buffer is only created from a full DB read, and afterwards the
+    write path appends to it, so a cached window is always complete. Users
+    are evicted least-recently-used once max_users is reached.
+    """
+
+    def __init__(self, window: int = 4, max_users: int = 10000):
+        self.window = window
+        self.max_users = max_users
+        self._buffers: OrderedDict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str):
+        """Return a copy of the cached history, or None if the user is not cached."""
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                self.misses += 1
+                return None
+            self._buffers.move_to_end(user_id)
+            self.hits += 1
+            return list(buffer)
+
+    def load(self, user_id: str, history: list):
+        """Seed a user's buffer from a DB read."""
+        with self._lock:
+            self._buffers[user_id] = deque(history, maxlen=self.window)
+            self._buffers.move_to_end(user_id)
+            while len(self._buffers) > self.max_users:
+                self._buffers.popitem(last=False)
+
+    def append(self, user_id: str, role: str, content: str):
+        """Record a newly written message, if the user is cached."""
+        if not content:
+            return
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is not None:
+                buffer.append({"role": role, "content": content})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._buffers), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,81 @@
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_lock = threading.Lock()
+
+
+class _Retry(Retry):
+    """
+    Retries GETs on connection errors, read errors, 429 and 5xx. A POST (a
+    Graph API send) is only retried when it cannot have been processed: a
+    failed connect or a 429. After a read timeout or a 5xx the message may
+    already be delivered, so callers (the outbox) decide whether to resend.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method == "POST":
+            return status_code == 429 and bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _build_session() -> requests.Session:
+    retry = _Retry(
+        total=config.HTTP_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide session, so outbound calls reuse keep-alive connections
+    instead of doing a TCP+TLS handshake each time. Connection pools are
+    thread-safe.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def timeout_for(url: str):
+    """(connect, read) timeout for the host of url."""
+    host = urlsplit(url).hostname or ""
+    return config.HTTP_CONNECT_TIMEOUT, config.HTTP_TIMEOUTS.get(host, config.HTTP_READ_TIMEOUT)
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", timeout_for(url))
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -0,0 +1,124 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MessageEvent:
+    """One inbound user message from a webhook delivery."""
+    wa_id: str
+    message_id: str
+    type: str
+    text: Optional[str] = None
+    name: Optional[str] = None
+    timestamp: Optional[str] = None
+    phone_number_id: Optional[str] = None
+    raw: dict = field(default_factory=dict, repr=False)
+
+
+@dataclass
+class StatusEvent:
+    """Delivery status update (sent/delivered/read/failed) for a message we sent."""
+    message_id: str
+    status: str
+    recipient_id: Optional[str] = None
+    timestamp: Optional[str] = None
+    phone_number_id: Optional[str] = None
+    errors: list = field(default_factory=list)
+
+
+Event = Union[MessageEvent, StatusEvent]
+
+_lock = threading.Lock()
+_counts = {"requests": 0, "messages": 0, "statuses": 0}
+
+
+def load_payload(raw: bytes) -> dict:
+    """Parse the raw request body once; raises ValueError on invalid JSON."""
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(str(e)) from e
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(str(e)) from e
+
+
+def _message_text(message: dict) -> Optional[str]:
+    if message.get("type") == "text":
+        return (message.get("text") or {}).get("body")
+    if message.get("type") == "button":
+        return (message.get("button") or {}).get("text")
+    if message.get("type") == "interactive":
+        interactive = message.get("interactive") or {}
+        reply = interactive.get("button_reply") or interactive.get("list_reply") or {}
+        return reply.get("title")
+    return None
+
+
+def parse_events(body: dict) -> list:
+    """
+    Walk every entry, change, message and status of a webhook payload
+    (Meta may batch several into one POST) into a flat list of events.
+    """
+    events = []
+    if not isinstance(body, dict) or not body.get("object"):
+        return events
+
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            phone_number_id = (value.get("metadata") or {}).get("phone_number_id")
+            names = {
+                contact.get("wa_id"): (contact.get("profile") or {}).get("name")
+                for contact in value.get("contacts") or []
+            }
+
+            for message in value.get("messages") or []:
+                wa_id = message.get("from")
+                if not wa_id:
+                    continue
+                events.append(MessageEvent(
+                    wa_id=wa_id,
+                    message_id=message.get("id"),
+                    type=message.get("type"),
+                    text=_message_text(message),
+                    name=names.get(wa_id),
+                    timestamp=message.get("timestamp"),
+                    phone_number_id=phone_number_id,
+                    raw=message,
+                ))
+
+            for status in value.get("statuses") or []:
+                events.append(StatusEvent(
+                    message_id=status.get("id"),
+                    status=status.get("status"),
+                    recipient_id=status.get("recipient_id"),
+                    timestamp=status.get("timestamp"),
+                    phone_number_id=phone_number_id,
+                    errors=status.get("errors") or [],
+                ))
+
+    messages = sum(1 for e in events if isinstance(e, MessageEvent))
+    with _lock:
+        _counts["requests"] += 1
+        _counts["messages"] += messages
+        _counts["statuses"] += len(events) - messages
+    logger.info(f"Webhook delivery contained {messages} messages and {len(events) - messages} statuses")
+    return events
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counts)
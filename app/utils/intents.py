@@ -0,0 +1,138 @@
+import random
+import re
+import threading
+from typing import Optional
+
+GREETING = "greeting"
+THANKS = "thanks"
+ACK = "ack"
+EMOJI = "emoji"
+MEDIA = "media"
+
+MEDIA_TYPES = {"image", "audio", "video", "document", "sticker", "location", "contacts"}
+
+# Multi-word phrases are joined into one token before lookup
+_PHRASES = re.compile(
+    r"\b(terima\s+kasih|thank\s+you|selamat\s+(?:pagi|petang|tengah\s+hari|malam)"
+    r"|good\s+(?:morning|afternoon|evening)|assalamu?\s*alaikum|ok(?:ay)?\s+noted)\b"
+)
+_REPEATS = re.compile(r"(\w)\1{2,}")
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# keyword -> (intent, language); language None means either
+LEXICON = {
+    # greetings
+    "hi": (GREETING, None), "hai": (GREETING, "ms"), "hello": (GREETING, "en"), "helo": (GREETING, "ms"),
+    "hey": (GREETING, "en"), "yo": (GREETING, None), "salam": (GREETING, "ms"),
+    "assalamualaikum": (GREETING, "ms"), "assalamu_alaikum": (GREETING, "ms"),
+    "selamat_pagi": (GREETING, "ms"), "selamat_petang": (GREETING, "ms"),
+    "selamat_tengah_hari": (GREETING, "ms"), "selamat_malam": (GREETING, "ms"),
+    "good_morning": (GREETING, "en"), "good_afternoon": (GREETING, "en"), "good_evening": (GREETING, "en"),
+    # thanks
+    "thanks": (THANKS, "en"), "thank_you": (THANKS, "en"), "thx": (THANKS, "en"), "ty": (THANKS, "en"),
+    "tq": (THANKS, None), "tqvm": (THANKS, None), "tenkiu": (THANKS, "ms"), "terima_kasih": (THANKS, "ms"),
+    "terimakasih": (THANKS, "ms"), "mksh": (THANKS, "ms"),
+    # acknowledgements
+    "ok": (ACK, None), "okay": (ACK, "en"), "okey": (ACK, "ms"), "k": (ACK, None), "noted": (ACK, "en"),
+    "ok_noted": (ACK, None), "okay_noted": (ACK, "en"), "baik": (ACK, "ms"), "faham": (ACK, "ms"),
+    "alright": (ACK, "en"), "sure": (ACK, "en"), "cool": (ACK, "en"), "nice": (ACK, "en"),
+    "orait": (ACK, "ms"), "set": (ACK, "ms"), "roger": (ACK, None),
+}
+
+# Words that may accompany a trivial message without changing what it means
+FILLER = {
+    "bro", "sis", "boss", "bos", "admin", "min", "tuan", "puan", "encik", "cik", "abang", "bang", "kak",
+    "akak", "je", "jer", "ja", "ya", "yaa", "ye", "lah", "la", "dah", "so", "much", "very", "all", "there",
+    "guys", "semua", "banyak", "byk", "sangat", "you", "u", "team", "carching", "and", "n", "dan",
+}
+
+# Priority when a message mixes intents ("ok tq" is a thanks)
+_PRIORITY = (THANKS, GREETING, ACK)
+MAX_TOKENS = 6
+
+TEMPLATES = {
+    GREETING: {
+        "ms": ["Hai! 👋 Ada apa-apa boleh saya bantu pasal Carching hari ni?",
+               "Salam! Nak tanya pasal campaign ke, bayaran ke? Tanya je 😊"],
+        "en": ["Hi there! 👋 How can I help you with Carching today?"],
+    },
+    THANKS: {
+        "ms": ["Sama-sama! 😊 Kalau ada soalan lain, roger je.", "Takde hal! Apa-apa tanya je ya 👍"],
+        "en": ["You're welcome! 😊 Let me know if there's anything else."],
+    },
+    ACK: {
+        "ms": ["Baik! 👍 Kalau ada apa-apa lagi, tanya je ya."],
+        "en": ["Great! 👍 Just message me if you need anything else."],
+    },
+    EMOJI: {
+        "ms": ["😊 Ada apa-apa boleh saya bantu?"],
+        "en": ["😊 Anything I can help you with?"],
+    },
+    MEDIA: {
+        "ms": ["Terima kasih! Buat masa ni saya cuma boleh baca mesej teks. Boleh taip soalan anda? 🙏"],
+        "en": ["Thanks! For now I can only read text messages. Could you type your question? 🙏"],
+    },
+}
+
+_lock = threading.Lock()
+_counts = {intent: 0 for intent in TEMPLATES}
+_counts["llm"] = 0
+
+
+def _tokens(text: str) -> list:
+    text = _REPEATS.sub(r"\1", text.lower())
+    text = _PHRASES.sub(lambda m: re.sub(r"\s+", "_", m.group(0)), text)
+    return _TOKEN.findall(text)
+
+
+def classify(message_type: str, text: Optional[str]) -> tuple:
+    """
+    Return (intent, language) for a trivial message that needs no retrieval,
+    or (None, None) for anything that should go through the RAG pipeline.
+
+    A text is trivial only if it is short and every word is either a
+    lexicon keyword or filler, so "hi, how much does it pay?" still reaches
+    the LLM.
+    """
+    if not text or not text.strip():
+        return (MEDIA, "ms") if message_type in MEDIA_TYPES else (None, None)
+
+    tokens = _tokens(text)
+    if not tokens:
+        return EMOJI, "ms"
+    if len(tokens) > MAX_TOKENS:
+        return None, None
+
+    found, languages = set(), set()
+    for token in tokens:
+        entry = LEXICON.get(token)
+        if entry is not None:
+            found.add(entry[0])
+            if entry[1]:
+                languages.add(entry[1])
+        elif token not in FILLER:
+            return None, None
+
+    for intent in _PRIORITY:
+        if intent in found:
+            language = "en" if languages == {"en"} else "ms"
+            return intent, language
+    return None, None
+
+
+def reply_for(intent: str, language: str) -> str:
+    return random.choice(TEMPLATES[intent][language])
+
+
+def record(intent: Optional[str]):
+    """Count a routing decision; None means the message went to the LLM."""
+    with _lock:
+        _counts[intent or "llm"] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        counts = dict(_counts)
+    routed = sum(v for k, v in counts.items() if k != "llm")
+    total = routed + counts["llm"]
+    return {**counts, "short_circuit_rate": routed / total if total else 0.0}
@@ -1,94 +1,257 @@
-from openai import OpenAI
-from pinecone import Pinecone
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from openai import NOT_GIVEN, OpenAI
 import config
+from app.utils import generations
+from app.utils import metrics
+from app.utils import retriever
+from app.utils.answer_cache import AnswerCache, context_fingerprint
+from app.utils.context import SEPARATOR, pack_context
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.resilience import CircuitBreaker, CircuitOpen, Deadline, DeadlineExceeded, LatencyTracker
+
+logger = logging.getLogger(__name__)
 
 
 # Initialize clients once
-client = OpenAI(api_key=config.OPENAI_API_KEY)
-pc = Pinecone(api_key=config.PINECONE_API_KEY)
-index = pc.Index(config.DEMO_INDEX_NAME)
+client = OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL)
+index = retriever.get_index(config.DEMO_INDEX_NAME)
+query_cache = EmbeddingCache(max_size=config.EMBED_CACHE_SIZE, path=config.EMBED_CACHE_PATH)
+answer_cache = AnswerCache(
+    threshold=config.ANSWER_CACHE_THRESHOLD,
+    ttl=config.ANSWER_CACHE_TTL,
+    max_size=config.ANSWER_CACHE_SIZE,
+) if config.ANSWER_CACHE_ENABLED else None
+completion_latency = LatencyTracker()
+breaker = CircuitBreaker(
+    error_rate=config.CIRCUIT_ERROR_RATE,
+    window=config.CIRCUIT_WINDOW,
+    min_calls=config.CIRCUIT_MIN_CALLS,
+    cooldown=config.CIRCUIT_COOLDOWN,
+)
+# Completions run here so a reply can wait on whichever of the first request and its hedge answers first
+_completion_pool = ThreadPoolExecutor(max_workers=config.COMPLETION_WORKERS, thread_name_prefix="completion")
 
 
 # -------------------------------
 # Helpers
 # -------------------------------
 
-def embed_text(text: str):
-    """Generate embedding for a given text."""
-    return client.embeddings.create(
-        model=config.EMBED_MODEL,
-        input=text
-    ).data[0].embedding
+def _client(timeout=NOT_GIVEN):
+    """The OpenAI client; bounded by timeout, without retries, when the call has a deadline."""
+    return client if timeout is NOT_GIVEN else client.with_options(timeout=timeout, max_retries=0)
 
 
-def fetch_context(query: str) -> str:
-    """Retrieve context from Pinecone for a query."""
-    try:
-        emb = embed_text(query)
-
-        result = index.query(
-            vector=emb,
-            top_k=getattr(config, "TOP_K", 5),
-            include_metadata=True,
-            include_values=False,
-            namespace=getattr(config, "NAMESPACE", None)
+def _create_embedding(text: str, timeout=NOT_GIVEN):
+    with metrics.timed("embed_api"):
+        response = _client(timeout).embeddings.create(
+            model=config.EMBED_MODEL,
+            input=text
         )
+    metrics.record_usage(config.EMBED_MODEL, response.usage)
+    return response.data[0].embedding
+
 
-        matches = getattr(result, "matches", []) or []
-        if not matches:
-            return ""
+def embed_text(text: str, deadline: Deadline = None):
+    """Generate embedding for a given text, served from the query cache when possible."""
+    timeout = deadline.timeout(config.EMBED_TIMEOUT) if deadline else NOT_GIVEN
+    with metrics.timed("embed"):
+        return query_cache.get_or_compute(text, config.EMBED_MODEL, lambda t: _create_embedding(t, timeout))
 
-        min_score = getattr(config, "MIN_SCORE", 0.0)
-        max_chars = getattr(config, "MAX_CONTEXT_CHARS", 8000)
 
-        contexts, total = [], 0
-        for m in matches:
-            score = getattr(m, "score", None)
-            if score is not None and score < min_score:
-                continue
+def retrieve(query: str, deadline: Deadline = None):
+    """Embed a query and fetch its nearest chunks; returns (embedding, matches)."""
+    try:
+        emb = embed_text(query, deadline)
 
-            meta = m.metadata or {}
-            text = meta.get("text") or ""
-            if not text:
-                continue
+        options = {"_request_timeout": deadline.timeout(config.VECTOR_QUERY_TIMEOUT)} if deadline else {}
+        with metrics.timed("vector_query"):
+            result = index.query(
+                vector=emb,
+                top_k=getattr(config, "TOP_K", 5),
+                include_metadata=True,
+                include_values=False,
+                namespace=generations.active_namespace(config.DEMO_INDEX_NAME),
+                **options,
+            )
 
-            file_name = meta.get("file_name", "")
-            chunk_num = meta.get("chunk_num")
-            header = f"Source: {file_name}" + (f" (chunk {chunk_num})" if chunk_num is not None else "")
+        return emb, getattr(result, "matches", []) or []
 
-            snippet = f"{header}\n{text}" if header.strip() else text
-            if total + len(snippet) > max_chars:
-                break
+    except Exception:
+        metrics.fallbacks.inc(reason="no_retrieval")
+        return None, []
 
-            contexts.append(snippet)
-            total += len(snippet)
 
-        return "\n\n---\n\n".join(contexts)
+def assemble_context(matches: list, model: str = config.CHAT_MODEL):
+    """Turn matches into prompt context; returns (context, matches actually used)."""
+    packed = pack_context(
+        matches,
+        model,
+        max_tokens=config.CONTEXT_MAX_TOKENS,
+        min_score=getattr(config, "MIN_SCORE", 0.0),
+        dedup_threshold=config.CONTEXT_DEDUP_THRESHOLD,
+    )
+    return packed.text, packed.used
 
-    except Exception:
-        return ""
 
+def join_context(context: str, extra_context: str = None) -> str:
+    if not extra_context:
+        return context
+    return f"{context}{SEPARATOR}{extra_context}" if context else extra_context
 
-def build_messages(message: str, chat_history: list, system_prompt_template: str, context: str):
+
+def build_messages(message: str, chat_history: list, system_prompt_template: str, context: str,
+                   summary: str = None):
     """Construct messages for the LLM."""
     system_prompt = system_prompt_template.format(context=context)
-    return [
-        {"role": "system", "content": system_prompt},
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation with this user:\n{summary}"})
+    return messages + [
         *chat_history,
         {"role": "user", "content": message},
     ]
 
 
-def ask_llm(messages: list, model_choice: str) -> str:
+def ask_llm(messages: list, model_choice: str, timeout=NOT_GIVEN) -> str:
     """Send messages to OpenAI and return reply."""
-    response = client.chat.completions.create(
-        model=model_choice,
-        messages=messages,
-        # temperature=0.7,
-    )
+    started = time.perf_counter()
+    with metrics.timed("completion"):
+        response = _client(timeout).chat.completions.create(
+            model=model_choice,
+            messages=messages,
+            # temperature=0.7,
+        )
+    return completion_text(response, model_choice, time.perf_counter() - started)
+
+
+def completion_text(response, model_choice: str, seconds: float) -> str:
+    """Record a chat completion's latency and token usage; returns its reply text."""
+    metrics.model_seconds.observe(seconds, model=model_choice)
+    logger.info(f"Completion on {model_choice} took {seconds:.2f}s")
+    metrics.record_usage(model_choice, response.usage)
     return response.choices[0].message.content
 
 
+def hedge_delay() -> float:
+    """Seconds to wait on a completion before hedging it."""
+    return max(completion_latency.percentile(config.HEDGE_PERCENTILE, config.HEDGE_MIN_DELAY), config.HEDGE_MIN_DELAY)
+
+
+def observe_completion(started: float):
+    """Done callback feeding a completion's latency to hedge_delay(); a cancelled one counts as at least this slow."""
+    def observe(future):
+        if future.cancelled() or future.exception() is None:
+            completion_latency.observe(time.monotonic() - started)
+    return observe
+
+
+class HedgedCall:
+    """
+    Decisions for one hedged completion: the circuit breaker, when to send
+    the hedge and on which model, which result wins, and what to raise when
+    none does. complete() and the async pipeline drive it with their own
+    futures; only how they wait differs.
+    """
+
+    def __init__(self, model_choice: str, deadline: Deadline):
+        self.timeout = deadline.timeout()
+        if not breaker.allow():
+            raise CircuitOpen("completions are failing, failing fast")
+        self.model_choice = model_choice
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.hedge_at = self.started + hedge_delay() if config.HEDGE_ENABLED else None
+        self.primary = None
+        self.error = None
+
+    def track(self, primary):
+        """Register the first request's future; every completion that finishes feeds the percentile."""
+        self.primary = primary
+        primary.add_done_callback(observe_completion(self.started))
+        return primary
+
+    def waiting(self, pending) -> bool:
+        return bool(pending) and self.deadline.remaining() > 0
+
+    def wait_time(self) -> float:
+        """Seconds to wait for a result before checking whether to hedge."""
+        remaining = self.deadline.remaining()
+        if self.hedge_at is not None:
+            remaining = min(remaining, self.hedge_at - time.monotonic())
+        return max(remaining, 0)
+
+    def succeeded(self, future) -> bool:
+        """Whether a finished future is the answer; failures are kept for failure()."""
+        if future.exception() is not None:
+            self.error = future.exception()
+            return False
+        if future is not self.primary:
+            metrics.hedges.inc(outcome="won")
+        breaker.record(True)
+        return True
+
+    def hedge(self, pending):
+        """(model, timeout) for the hedge request once it is due, else None."""
+        remaining = self.deadline.remaining()
+        if self.hedge_at is None or time.monotonic() < self.hedge_at or not pending or remaining <= 0:
+            return None
+        self.hedge_at = None
+        hedge_model = config.HEDGE_MODEL or self.model_choice
+        logger.info(f"Completion slower than {hedge_delay():.2f}s, hedging on {hedge_model}")
+        metrics.hedges.inc(outcome="sent")
+        return hedge_model, remaining
+
+    def failure(self) -> Exception:
+        breaker.record(False)
+        if self.deadline.remaining() <= 0:
+            error = DeadlineExceeded(f"no completion within the {self.deadline.seconds}s reply budget")
+            error.__cause__ = self.error
+            return error
+        return self.error
+
+
+def complete(messages: list, model_choice: str, deadline: Deadline) -> str:
+    """
+    ask_llm within the reply's deadline and behind the circuit breaker. If
+    the request is still running after hedge_delay(), a second one is sent
+    (on HEDGE_MODEL when set) and the first answer wins.
+    """
+    call = HedgedCall(model_choice, deadline)
+    pending = {call.track(_completion_pool.submit(ask_llm, messages, model_choice, call.timeout))}
+    while call.waiting(pending):
+        done, pending = wait(pending, timeout=call.wait_time(), return_when=FIRST_COMPLETED)
+        for future in done:
+            if call.succeeded(future):
+                return future.result()
+        hedge = call.hedge(pending)
+        if hedge is not None:
+            pending.add(_completion_pool.submit(ask_llm, messages, *hedge))
+    raise call.failure()
+
+
+def summarize(previous_summary: str, turns: list, model_choice: str = config.SUMMARY_MODEL) -> str:
+    """Fold turns into previous_summary and return the new summary."""
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You maintain a running summary of a WhatsApp support conversation. "
+                "Merge the new messages into the existing summary. Keep the user's details, "
+                "questions, preferences and anything promised to them; drop small talk. "
+                f"Answer with the updated summary only, in at most {config.SUMMARY_MAX_WORDS} words, "
+                "in the language the user writes in."
+            ),
+        },
+        {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+    return (ask_llm(messages, model_choice) or "").strip()
+
+
 def update_history(chat_history: list, user_message: str, bot_reply: str):
     """Update conversation history with new messages."""
     return chat_history[-4:] + [
@@ -97,19 +260,162 @@ def update_history(chat_history: list, user_message: str, bot_reply: str):
     ]
 
 
+def lookup_answer(emb, used: list, chat_history: list, summary: str, system_prompt_template: str,
+                  model_choice: str, extra_context: str = None):
+    """Returns (cached answer or None, fingerprint to store a new answer under or None)."""
+    # Answers depend on the conversation, so only history-free questions are shared
+    if answer_cache is None or emb is None:
+        return None, None
+    if chat_history or summary:
+        answer_cache.record_bypass()
+        return None, None
+    fingerprint = context_fingerprint(used, system_prompt_template, model_choice, extra_context)
+    return answer_cache.lookup(emb, fingerprint), fingerprint
+
+
+def store_answer(emb, fingerprint: str, bot_reply: str):
+    if fingerprint is not None and bot_reply:
+        answer_cache.store(emb, fingerprint, bot_reply)
+
+
+# -------------------------------
+# Model routing
+# -------------------------------
+
+# Weights of the complexity signals, each scored 0-1; they sum to 1
+ROUTE_WEIGHTS = {"length": 0.4, "uncertainty": 0.4, "depth": 0.2}
+
+
+@dataclass
+class Route:
+    model: str
+    score: float
+    signals: dict = field(default_factory=dict)
+
+
+def _scale(value: float, low: float, high: float) -> float:
+    if high <= low:
+        return 1.0 if value >= high else 0.0
+    return min(max((value - low) / (high - low), 0.0), 1.0)
+
+
+def route_model(message: str, matches: list, chat_history: list, summary: str = None,
+                structured: bool = False) -> Route:
+    """
+    Pick FAST_MODEL for simple, well-grounded questions and STRONG_MODEL for
+    hard ones. The score weighs the message length, how weak the best
+    retrieval match is (structured campaign context counts as exact) and
+    how long the conversation has been going.
+    """
+    words = len(message.split())
+    scores = [m.score for m in matches if getattr(m, "score", None) is not None]
+    top_score = max(scores) if scores else None
+    prior = len(chat_history or []) + (config.HISTORY_WINDOW if summary else 0)
+
+    if structured:
+        uncertainty = 0.0
+    elif top_score is None:
+        uncertainty = 1.0
+    else:
+        uncertainty = 1.0 - _scale(top_score, config.ROUTER_WEAK_SCORE, config.ROUTER_CONFIDENT_SCORE)
+
+    signals = {
+        "length": _scale(words, 0, config.ROUTER_LONG_WORDS),
+        "uncertainty": uncertainty,
+        "depth": _scale(prior, 0, config.ROUTER_DEEP_MESSAGES),
+    }
+    score = sum(ROUTE_WEIGHTS[name] * value for name, value in signals.items())
+    model = config.STRONG_MODEL if score >= config.ROUTER_THRESHOLD else config.FAST_MODEL
+
+    metrics.model_routes.inc(model=model)
+    logger.info(
+        f"Routed to {model} (score {score:.2f}; {words} words, "
+        f"top match {'-' if top_score is None else f'{top_score:.2f}'}, {prior} prior messages)"
+    )
+    return Route(model=model, score=score, signals=signals)
+
+
+def reply_model():
+    """model_choice for WhatsApp replies: None lets generate route each one."""
+    return None if config.MODEL_ROUTER_ENABLED else config.CHAT_MODEL
+
+
 # -------------------------------
 # Main generate function
 # -------------------------------
 
-def generate(message: str, chat_history: list, system_prompt_template: str, model_choice: str):
-    """Main entry point to generate a response."""
+def fallback_reason(error: Exception) -> str:
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, DeadlineExceeded):
+        return "deadline"
+    return "error"
+
+
+def generate(message: str, chat_history: list, system_prompt_template: str, model_choice: str = None,
+             summary: str = None, context: str = None, deadline: Deadline = None, extra_context: str = None):
+    """
+    Main entry point to generate a response. A caller that already has the
+    context (e.g. from the structured campaign table) passes it in, which
+    skips embedding and vector search; extra_context is added to the
+    retrieved context instead. Without a model_choice the model is
+    picked by route_model. Every upstream call shares deadline
+    (REPLY_DEADLINE_SECONDS from now by default); on failure the user gets
+    FALLBACK_REPLY.
+    """
+    deadline = deadline or Deadline(config.REPLY_DEADLINE_SECONDS)
     try:
-        context = fetch_context(message)
-        messages = build_messages(message, chat_history, system_prompt_template, context)
-        bot_reply = ask_llm(messages, model_choice)
+        emb, matches = retrieve(message, deadline) if context is None else (None, [])
+        prompt = prepare_prompt(message, chat_history, system_prompt_template, model_choice, summary, context,
+                                extra_context, emb, matches)
+        if prompt.cached is not None:
+            return update_history(chat_history, message, prompt.cached), prompt.cached
+
+        bot_reply = complete(prompt.messages, prompt.model, deadline)
+        store_answer(prompt.emb, prompt.fingerprint, bot_reply)
+
         updated_history = update_history(chat_history, message, bot_reply)
         return updated_history, bot_reply
 
     except Exception as e:
-        fallback = f"Sorry, I encountered an error: {str(e)}"
-        return update_history(chat_history, message, fallback), fallback
+        bot_reply = fallback_reply(e)
+        return update_history(chat_history, message, bot_reply), bot_reply
+
+
+@dataclass
+class Prompt:
+    model: str
+    messages: list = None
+    emb: list = None
+    fingerprint: str = None
+    cached: str = None
+
+
+def prepare_prompt(message: str, chat_history: list, system_prompt_template: str, model_choice: str, summary: str,
+                   context: str, extra_context: str, emb: list, matches: list) -> Prompt:
+    """
+    Everything generate() decides between retrieval and the completion:
+    routing, context assembly and the answer cache. A cache hit comes back
+    as Prompt.cached with no messages to send.
+    """
+    structured = context is not None
+    used = []
+    if model_choice is None:
+        model_choice = route_model(message, matches, chat_history, summary, structured).model
+    if not structured:
+        context, used = assemble_context(matches, model_choice)
+        context = join_context(context, extra_context)
+
+    cached, fingerprint = lookup_answer(emb, used, chat_history, summary, system_prompt_template, model_choice,
+                                        extra_context)
+    if cached is not None:
+        return Prompt(model_choice, emb=emb, cached=cached)
+    messages = build_messages(message, chat_history, system_prompt_template, context, summary)
+    return Prompt(model_choice, messages, emb, fingerprint)
+
+
+def fallback_reply(error: Exception) -> str:
+    reason = fallback_reason(error)
+    metrics.fallbacks.inc(reason=reason)
+    logger.error(f"Failed to generate a reply ({reason}): {str(error)}")
+    return config.FALLBACK_REPLY
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Match:
+    id: str
+    score: float
+    metadata: Optional[dict] = None
+    values: Optional[list] = None
+
+
+@dataclass
+class QueryResult:
+    matches: list
+    namespace: str = ""
+
+
+@dataclass
+class NamespaceSummary:
+    vector_count: int
+
+
+@dataclass
+class IndexStats:
+    namespaces: dict = field(default_factory=dict)
+    dimension: int = 0
+
+    @property
+    def total_vector_count(self) -> int:
+        return sum(summary.vector_count for summary in self.namespaces.values())
+
+
+@dataclass
+class _Namespace:
+    ids: list
+    metadata: list
+    matrix: np.ndarray
+    signature: tuple
+
+
+def _matches_filter(metadata: dict, flt: dict) -> bool:
+    """Evaluate the subset of Pinecone's metadata filter language we use ($eq/$ne/$in/$nin/$and/$or)."""
+    for key, condition in flt.items():
+        if key == "$and":
+            if not all(_matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+    return True
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index implementing the part of the Pinecone Index API
+    this app uses (upsert, delete, query, describe_index_stats), so it can be
+    swapped in wherever a Pinecone index is expected.
+
+    Each namespace is a matrix of L2-normalized float32 rows, so cosine
+    similarity is a single matrix-vector product. Namespaces are persisted
+    under path as a .f32 matrix plus a JSON manifest of ids and metadata; the
+    manifest is replaced atomically and always names the matrix file it
+    belongs to. Files changed by another process (e.g. a sync run) are picked
+    up on the next query.
+    """
+
+    def __init__(self, path: str, dim: int, mmap: bool = True):
+        self.path = path
+        self.dim = dim
+        self.mmap = mmap
+        self._namespaces: dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+    def _manifest_path(self, namespace: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace) if namespace else "__default__"
+        return os.path.join(self.path, f"{safe}.json")
+
+    def _namespace(self, namespace: str) -> Optional[_Namespace]:
+        """Loaded namespace, reloading it if its files changed on disk."""
+        manifest_path = self._manifest_path(namespace)
+        try:
+            stat = os.stat(manifest_path)
+        except FileNotFoundError:
+            self._namespaces.pop(namespace, None)
+            return None
+
+        # Saves replace the manifest file, so a new inode or mtime means new contents
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        loaded = self._namespaces.get(namespace)
+        if loaded is not None and loaded.signature == signature:
+            return loaded
+
+        with open(manifest_path, encoding="utf-8") as f:
+            data = json.load(f)
+        vectors_path = os.path.join(self.path, data["vectors_file"])
+        rows = len(data["ids"])
+        if rows == 0:
+            matrix = np.zeros((0, self.dim), dtype=np.float32)
+        elif self.mmap:
+            matrix = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            matrix = np.fromfile(vectors_path, dtype=np.float32).reshape(rows, self.dim)
+
+        loaded = _Namespace(ids=data["ids"], metadata=data["metadata"], matrix=matrix, signature=signature)
+        self._namespaces[namespace] = loaded
+        logger.debug(f"Loaded {rows} vectors for namespace '{namespace}' from {self.path}")
+        return loaded
+
+    def _save(self, namespace: str, ids: list, metadata: list, matrix: np.ndarray):
+        manifest_path = self._manifest_path(namespace)
+        old_vectors_file = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                old_vectors_file = json.load(f)["vectors_file"]
+
+        vectors_file = f"{os.path.basename(manifest_path)[:-5]}-{uuid.uuid4().hex}.f32"
+        with open(os.path.join(self.path, vectors_file), "wb") as f:
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"namespace": namespace, "vectors_file": vectors_file, "ids": ids, "metadata": metadata}, f)
+        os.replace(tmp_path, manifest_path)
+
+        self._namespaces.pop(namespace, None)
+        if old_vectors_file:
+            try:
+                os.remove(os.path.join(self.path, old_vectors_file))
+            except OSError:
+                # Still mapped by a reader on some platforms; leave it for the next save
+                pass
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def upsert(self, vectors: list, namespace: str = "", **kwargs):
+        if not vectors:
+            return {"upserted_count": 0}
+        with self._lock:
+            loaded = self._namespace(namespace)
+            ids = list(loaded.ids) if loaded else []
+            metadata = list(loaded.metadata) if loaded else []
+            rows = {vector_id: row for row, vector_id in enumerate(ids)}
+            matrix = np.array(loaded.matrix) if loaded else np.zeros((0, self.dim), dtype=np.float32)
+
+            values = self._normalize(np.asarray([v['values'] for v in vectors], dtype=np.float32))
+            appended = []
+            for v, row_values in zip(vectors, values):
+                row = rows.get(v['id'])
+                if row is None:
+                    rows[v['id']] = len(ids)
+                    appended.append(row_values)
+                    ids.append(v['id'])
+                    metadata.append(v.get('metadata') or {})
+                elif row < len(matrix):
+                    matrix[row] = row_values
+                    metadata[row] = v.get('metadata') or {}
+                else:
+                    appended[row - len(matrix)] = row_values
+                    metadata[row] = v.get('metadata') or {}
+
+            if appended:
+                matrix = np.vstack([matrix, np.asarray(appended, dtype=np.float32)])
+            self._save(namespace, ids, metadata, matrix)
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: list = None, delete_all: bool = False, namespace: str = "", **kwargs):
+        with self._lock:
+            if delete_all:
+                loaded = self._namespace(namespace)
+                manifest_path = self._manifest_path(namespace)
+                if loaded is not None:
+                    with open(manifest_path, encoding="utf-8") as f:
+                        vectors_file = json.load(f)["vectors_file"]
+                    os.remove(manifest_path)
+                    try:
+                        os.remove(os.path.join(self.path, vectors_file))
+                    except OSError:
+                        pass
+                self._namespaces.pop(namespace, None)
+                return {}
+
+            loaded = self._namespace(namespace)
+            if loaded is None or not ids:
+                return {}
+            drop = set(ids)
+            keep = [row for row, vector_id in enumerate(loaded.ids) if vector_id not in drop]
+            if len(keep) == len(loaded.ids):
+                return {}
+            self._save(
+                namespace,
+                [loaded.ids[row] for row in keep],
+                [loaded.metadata[row] for row in keep],
+                np.asarray(loaded.matrix[keep], dtype=np.float32).reshape(len(keep), self.dim),
+            )
+        return {}
+
+    def query(self, vector: list, top_k: int = 10, namespace: str = "", filter: dict = None,
+              include_metadata: bool = False, include_values: bool = False, **kwargs) -> QueryResult:
+        with self._lock:
+            loaded = self._namespace(namespace or "")
+        if loaded is None or not loaded.ids:
+            return QueryResult(matches=[], namespace=namespace or "")
+
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        scores = loaded.matrix @ query
+
+        if filter:
+            mask = np.fromiter((_matches_filter(m, filter) for m in loaded.metadata), dtype=bool, count=len(loaded.ids))
+            scores = np.where(mask, scores, -np.inf)
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        matches = [
+            Match(
+                id=loaded.ids[row],
+                score=float(scores[row]),
+                metadata=loaded.metadata[row] if include_metadata else None,
+                values=loaded.matrix[row].tolist() if include_values else None,
+            )
+            for row in top
+            if np.isfinite(scores[row])
+        ]
+        return QueryResult(matches=matches, namespace=namespace or "")
+
+    def describe_index_stats(self, **kwargs) -> IndexStats:
+        namespaces = {}
+        with self._lock:
+            for name in os.listdir(self.path):
+                if not name.endswith(".json"):
+                    continue
+                with open(os.path.join(self.path, name), encoding="utf-8") as f:
+                    data = json.load(f)
+                namespaces[data["namespace"]] = NamespaceSummary(vector_count=len(data["ids"]))
+        return IndexStats(namespaces=namespaces, dimension=self.dim)
@@ -0,0 +1,79 @@
+from app.extensions import db
+from app.models import SyncManifest
+
+
+def load(index_name: str, namespace: str, source: str) -> dict:
+    """Manifest entries for one source of an index generation, as plain dicts keyed by item key."""
+    rows = SyncManifest.query.filter_by(index_name=index_name, namespace=namespace, source=source).all()
+    return {
+        row.key: {
+            'key': row.key,
+            'name': row.name,
+            'modified_time': row.modified_time,
+            'content_hash': row.content_hash,
+            'chunk_count': row.chunk_count,
+        }
+        for row in rows
+    }
+
+
+def has_generation(index_name: str, namespace: str) -> bool:
+    return db.session.query(
+        SyncManifest.query.filter_by(index_name=index_name, namespace=namespace).exists()
+    ).scalar()
+
+
+def upsert(index_name: str, namespace: str, source: str, record: dict) -> None:
+    """Insert or update the row for record['key']; call commit() when the batch is done."""
+    row = SyncManifest.query.filter_by(
+        index_name=index_name, namespace=namespace, source=source, key=record['key']
+    ).first()
+    if row is None:
+        row = SyncManifest(index_name=index_name, namespace=namespace, source=source, key=record['key'])
+        db.session.add(row)
+    row.name = record.get('name')
+    row.modified_time = record.get('modified_time')
+    row.content_hash = record.get('content_hash')
+    row.chunk_count = record.get('chunk_count', 0)
+
+
+def remove(index_name: str, namespace: str, source: str, keys) -> None:
+    keys = list(keys)
+    if keys:
+        SyncManifest.query.filter(
+            SyncManifest.index_name == index_name,
+            SyncManifest.namespace == namespace,
+            SyncManifest.source == source,
+            SyncManifest.key.in_(keys),
+        ).delete(synchronize_session=False)
+
+
+def replace_generation(index_name: str, namespace: str, records: dict) -> None:
+    """Write the full manifest ({source: [record, ...]}) of a freshly built generation."""
+    SyncManifest.query.filter_by(index_name=index_name, namespace=namespace).delete(synchronize_session=False)
+    for source, source_records in records.items():
+        for record in source_records:
+            db.session.add(SyncManifest(
+                index_name=index_name,
+                namespace=namespace,
+                source=source,
+                key=record['key'],
+                name=record.get('name'),
+                modified_time=record.get('modified_time'),
+                content_hash=record.get('content_hash'),
+                chunk_count=record.get('chunk_count', 0),
+            ))
+    db.session.commit()
+
+
+def prune(index_name: str, keep_namespaces) -> None:
+    """Forget manifests of generations that no longer exist."""
+    SyncManifest.query.filter(
+        SyncManifest.index_name == index_name,
+        SyncManifest.namespace.notin_(list(keep_namespaces)),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def commit() -> None:
+    db.session.commit()
@@ -0,0 +1,213 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "carching"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        lines = self.header()
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text format.
+
+    Updates take one lock and a dict lookup, so instrumentation can stay on in
+    production. Collectors are callables returning a flat dict of numbers
+    (the stats() of caches, pools and queues); they are read at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._add(Counter(f"{PREFIX}_{name}", help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()) -> Gauge:
+        return self._add(Gauge(f"{PREFIX}_{name}", help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{PREFIX}_{name}", help, labelnames, buckets))
+
+    def register_collector(self, name: str, collect):
+        with self._lock:
+            self._collectors[name] = collect
+
+    def _collected(self) -> list:
+        lines = []
+        with self._lock:
+            collectors = dict(self._collectors)
+        for name, collect in sorted(collectors.items()):
+            try:
+                stats = collect()
+            except Exception:
+                stats = {}
+                errors.inc(stage=f"collect_{name}")
+            for key, value in sorted(_flatten(stats).items()):
+                metric = f"{PREFIX}_{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {_number(value)}")
+        return lines
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.extend(self._collected())
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(stats: dict, prefix: str = "") -> dict:
+    """Numeric leaves of a nested stats dict, keyed by their underscore-joined path."""
+    flat = {}
+    for key, value in stats.items():
+        name = "".join(c if c.isalnum() else "_" for c in f"{prefix}{key}").lower()
+        if isinstance(value, bool):
+            flat[name] = int(value)
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+        elif isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}_"))
+        elif isinstance(value, list) and all(isinstance(v, (int, float)) for v in value):
+            flat.update({f"{name}_{i}": v for i, v in enumerate(value)})
+    return flat
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram("stage_seconds", "Time spent per reply pipeline stage.", ("stage",))
+errors = registry.counter("errors_total", "Exceptions raised per pipeline stage.", ("stage",))
+fallbacks = registry.counter("fallbacks_total", "Replies served by a fallback instead of the normal path.", ("reason",))
+hedges = registry.counter("hedged_completions_total", "Hedge completion requests sent, and those that answered first.", ("outcome",))
+model_routes = registry.counter("model_routes_total", "Replies routed to each chat model.", ("model",))
+model_seconds = registry.histogram("model_completion_seconds", "Chat completion latency per model.", ("model",))
+openai_tokens = registry.counter("openai_tokens_total", "Tokens reported by OpenAI responses.", ("model", "kind"))
+
+
+@contextmanager
+def timed(stage: str):
+    """Observe the duration of the block as stage; exceptions are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(stage=stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage=stage)
+
+
+def record_usage(model: str, usage):
+    """Count the token usage of an OpenAI chat or embeddings response."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if prompt:
+        openai_tokens.inc(prompt, model=model, kind="prompt")
+    if completion:
+        openai_tokens.inc(completion, model=model, kind="completion")
+
+
+def render() -> str:
+    return registry.render()
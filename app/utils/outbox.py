@@ -0,0 +1,307 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy.orm import aliased
+
+import config
+from app.extensions import db
+from app.models import OutboundMessage
+from app.utils import http
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Delivery statuses only move forward; "failed" can arrive at any point
+STATUS_RANK = {"pending": 0, "sending": 0, "sent": 1, "delivered": 2, "read": 3}
+
+
+class TokenBucket:
+    """Allows rate events per second on average, with bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the time waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def messages_url(phone_number_id: str) -> str:
+    return f"{config.GRAPH_API_BASE_URL}/{config.WHATSAPP_API_VERSION}/{phone_number_id}/messages"
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    delay = min(config.OUTBOX_MAX_BACKOFF, config.OUTBOX_BACKOFF * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def is_retryable(response: requests.Response) -> bool:
+    # Other 4xx (bad payload, recipient not on WhatsApp, ...) will fail the same way again
+    return response.status_code in (408, 429) or response.status_code >= 500
+
+
+class OutboxSender:
+    """
+    Threads that drain OutboundMessage rows to the Graph API.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED and leased by
+    pushing next_attempt_at forward, so several threads (and several app
+    instances) can drain the same table without sending a row twice while
+    the lease holds. Each row's lease is renewed with a compare-and-set just
+    before it is sent, and a row whose lease ran out while earlier rows in
+    the batch were sending is skipped, since another sender may hold it. A
+    row whose sender died mid-send is picked up again when its lease
+    expires, so delivery is at-least-once. Only a recipient's
+    oldest unsent row can be claimed, so replies to one user go out one at a
+    time and in order, retries included. Sends are rate limited per
+    phone_number_id in each process (N instances send at up to N times
+    OUTBOX_RATE) and failures are retried with exponential backoff until
+    max_attempts.
+    """
+
+    def __init__(self, size: int = 2, batch_size: int = 10, poll_interval: float = 1.0):
+        self.size = size
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._app = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._buckets = defaultdict(lambda: TokenBucket(config.OUTBOX_RATE, config.OUTBOX_BURST))
+        self._lock = threading.Lock()
+        self._counts = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "lease_lost": 0, "statuses": 0}
+
+    def init_app(self, app):
+        self._app = app
+
+    @property
+    def started(self) -> bool:
+        return bool(self._threads)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.size):
+                t = threading.Thread(target=self._run, name=f"outbox-sender-{i}", daemon=True)
+                self._threads.append(t)
+                t.start()
+        logger.info(f"Started {self.size} outbox senders")
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def enqueue(self, data: dict, phone_number_id: str = None) -> OutboundMessage:
+        """Persist a Graph API message payload for sending and wake the senders."""
+        message = OutboundMessage(
+            phone_number_id=phone_number_id or config.WHATSAPP_PHONE_NUMBER_ID,
+            recipient=data["to"],
+            payload=data,
+        )
+        db.session.add(message)
+        with metrics.timed("outbox_enqueue"):
+            db.session.commit()
+        self._count("enqueued")
+
+        if not self._threads:
+            self.start()
+        self._wakeup.set()
+        return message
+
+    def _run(self):
+        while True:
+            try:
+                with self._app.app_context():
+                    sent = self._drain_once()
+            except Exception as e:
+                logger.error(f"Outbox sender failed: {str(e)}", exc_info=True)
+                sent = 0
+            if not sent:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self):
+        """Lease up to batch_size sendable rows; returns (rows, the time their lease ends)."""
+        now = datetime.utcnow()
+        earlier = aliased(OutboundMessage)
+        waiting_behind = (
+            db.session.query(earlier.id)
+            .filter(
+                earlier.recipient == OutboundMessage.recipient,
+                earlier.id < OutboundMessage.id,
+                earlier.status.in_(("pending", "sending")),
+            )
+            .exists()
+        )
+        rows = (
+            OutboundMessage.query
+            .filter(
+                OutboundMessage.status.in_(("pending", "sending")),
+                OutboundMessage.next_attempt_at <= now,
+                ~waiting_behind,
+            )
+            .order_by(OutboundMessage.next_attempt_at, OutboundMessage.id)
+            .with_for_update(skip_locked=True)
+            .limit(self.batch_size)
+            .all()
+        )
+        lease_until = now + timedelta(seconds=config.OUTBOX_LEASE_SECONDS)
+        claimed = set()
+        for row in rows:
+            # Compare-and-set, so a database without SKIP LOCKED (SQLite in development) cannot hand one row to two senders
+            updated = (
+                OutboundMessage.query
+                .filter(
+                    OutboundMessage.id == row.id,
+                    OutboundMessage.status.in_(("pending", "sending")),
+                    OutboundMessage.next_attempt_at <= now,
+                )
+                .update({"status": "sending", "next_attempt_at": lease_until}, synchronize_session=False)
+            )
+            if updated:
+                claimed.add(row.id)
+        db.session.commit()
+        return [row for row in rows if row.id in claimed], lease_until
+
+    def _renew(self, row: OutboundMessage, leased_until: datetime) -> bool:
+        """
+        Extend the lease on row if this sender still holds it, i.e. it is
+        still sending with the lease this sender set. False if the row was
+        sent, failed or re-claimed meanwhile.
+        """
+        lease_until = datetime.utcnow() + timedelta(seconds=config.OUTBOX_LEASE_SECONDS)
+        updated = (
+            OutboundMessage.query
+            .filter(
+                OutboundMessage.id == row.id,
+                OutboundMessage.status == "sending",
+                OutboundMessage.next_attempt_at == leased_until,
+            )
+            .update({"next_attempt_at": lease_until}, synchronize_session=False)
+        )
+        db.session.commit()
+        return bool(updated)
+
+    def _drain_once(self) -> int:
+        """Claim and send one batch; returns how many rows were claimed."""
+        rows, lease_until = self._claim()
+        for row in rows:
+            self._send(row, lease_until)
+        return len(rows)
+
+    def _send(self, row: OutboundMessage, leased_until: datetime):
+        waited = self._buckets[row.phone_number_id].acquire()
+        if waited:
+            logger.debug(f"Rate limited send to {row.recipient} for {waited:.3f}s")
+
+        # Earlier sends in the batch (and the rate limit) can outlast the lease taken at claim time
+        if not self._renew(row, leased_until):
+            self._count("lease_lost")
+            logger.warning(f"Lease on outbox row {row.id} expired before it was sent, leaving it to its new holder")
+            return
+
+        headers = {
+            "Content-type": "application/json",
+            "Authorization": f"Bearer {config.WHATSAPP_ACCESS_TOKEN}",
+        }
+        row.attempts += 1
+        try:
+            with metrics.timed("send"):
+                response = http.post(messages_url(row.phone_number_id), json=row.payload, headers=headers)
+        except requests.RequestException as e:
+            self._fail(row, str(e), retryable=True)
+            return
+
+        if not response.ok:
+            self._fail(row, f"HTTP {response.status_code}: {response.text[:500]}", retryable=is_retryable(response))
+            return
+
+        try:
+            wa_message_id = response.json()["messages"][0]["id"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            wa_message_id = None
+            logger.warning(f"No message id in Graph API response for outbox row {row.id}: {response.text[:500]}")
+
+        row.status = "sent"
+        row.wa_message_id = wa_message_id
+        row.last_error = None
+        db.session.commit()
+        self._count("sent")
+        logger.info(f"Sent outbox row {row.id} to {row.recipient} as {wa_message_id} (attempt {row.attempts})")
+
+    def _fail(self, row: OutboundMessage, error: str, retryable: bool):
+        row.last_error = error
+        if retryable and row.attempts < config.OUTBOX_MAX_ATTEMPTS:
+            delay = retry_delay(row.attempts)
+            row.status = "pending"
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            self._count("retried")
+            logger.warning(f"Send of outbox row {row.id} failed ({error}), retrying in {delay:.1f}s")
+        else:
+            row.status = "failed"
+            self._count("failed")
+            logger.error(f"Giving up on outbox row {row.id} after {row.attempts} attempts: {error}")
+        db.session.commit()
+
+    def record_status(self, event) -> bool:
+        """Apply a delivery status webhook to the matching outbox row; False if none matches."""
+        if not event.message_id or not event.status:
+            return False
+        row = OutboundMessage.query.filter_by(wa_message_id=event.message_id).first()
+        if row is None:
+            return False
+
+        if event.status == "failed":
+            row.status = "failed"
+            row.last_error = "; ".join(
+                str(error.get("title") or error.get("message") or error) for error in event.errors
+            ) or row.last_error
+        elif row.status != "failed" and STATUS_RANK.get(event.status, -1) > STATUS_RANK.get(row.status, -1):
+            row.status = event.status
+        else:
+            return True
+        db.session.commit()
+        self._count("statuses")
+        return True
+
+    def stats(self) -> dict:
+        by_status = dict(
+            db.session.query(OutboundMessage.status, db.func.count(OutboundMessage.id))
+            .group_by(OutboundMessage.status)
+            .all()
+        )
+        with self._lock:
+            return {
+                "senders": self.size,
+                "started": self.started,
+                "rows": by_status,
+                **self._counts,
+            }
+
+
+sender = OutboxSender(
+    size=config.OUTBOX_WORKERS,
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    poll_interval=config.OUTBOX_POLL_INTERVAL,
+)
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from openai import NOT_GIVEN, AsyncOpenAI
+
+import config
+from app.utils import generations
+from app.utils import intents
+from app.utils import llm
+from app.utils import metrics
+from app.utils import retriever
+from app.utils import whatsapp
+from app.utils.ingest import MessageEvent
+from app.utils.resilience import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPipeline:
+    """
+    Reply pipeline multiplexed on one asyncio event loop.
+
+    Embedding, the vector query and the chat completion use the async
+    OpenAI and Pinecone clients, so an in-flight reply costs a coroutine
+    rather than a thread. Blocking work (DB reads and writes, the local
+    index) runs on a small thread pool inside the app context. The query is
+    embedded and searched while the message is claimed and the user's
+    history read, and that work is cancelled if the claim fails. Messages
+    from one wa_id are handled one at a time, in the order they were
+    submitted.
+    """
+
+    def __init__(self, max_inflight: int = 500, threads: int = 16):
+        self.max_inflight = max_inflight
+        self.threads = threads
+        self._app = None
+        self._loop = None
+        self._thread = None
+        self._openai = None
+        self._index = None
+        self._user_locks = {}
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._counts = {"submitted": 0, "processed": 0, "failed": 0, "rejected": 0}
+
+    def init_app(self, app):
+        self._app = app
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="pipeline-io"))
+            self._thread = threading.Thread(target=self._loop.run_forever, name="pipeline-loop", daemon=True)
+            self._thread.start()
+        logger.info(f"Started async reply pipeline (max {self.max_inflight} in flight, {self.threads} IO threads)")
+
+    def submit(self, event: MessageEvent) -> bool:
+        """Schedule a reply to event; returns False when max_inflight replies are already running."""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                self._counts["rejected"] += 1
+                logger.warning(f"Async pipeline full, rejecting message from {event.wa_id}")
+                return False
+            self._inflight += 1
+            self._counts["submitted"] += 1
+        asyncio.run_coroutine_threadsafe(self._handle(event), self._loop)
+        return True
+
+    async def _handle(self, event: MessageEvent):
+        try:
+            async with self._ordered(event.wa_id):
+                await self.process_message_event(event)
+            with self._lock:
+                self._counts["processed"] += 1
+        except Exception as e:
+            with self._lock:
+                self._counts["failed"] += 1
+            logger.error(f"Failed to process message {event.message_id}: {str(e)}", exc_info=True)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    @asynccontextmanager
+    async def _ordered(self, wa_id: str):
+        # Only touched from the loop thread; asyncio.Lock wakes waiters in FIFO order
+        entry = self._user_locks.get(wa_id)
+        if entry is None:
+            entry = self._user_locks[wa_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._user_locks[wa_id]
+
+    def _in_app_context(self, func, *args, **kwargs):
+        with self._app.app_context():
+            return func(*args, **kwargs)
+
+    async def in_thread(self, func, *args, **kwargs):
+        """Run a blocking call on the IO pool inside the app context."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._in_app_context(func, *args, **kwargs)
+        )
+
+    # -------------------------------
+    # Async clients
+    # -------------------------------
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        if self._openai is None:
+            self._openai = AsyncOpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL)
+        return self._openai
+
+    def _client(self, timeout=NOT_GIVEN) -> AsyncOpenAI:
+        return self.openai if timeout is NOT_GIVEN else self.openai.with_options(timeout=timeout, max_retries=0)
+
+    async def _query_index(self, **kwargs):
+        if self._index is None:
+            self._index = await self._open_index()
+        if self._index is False:
+            # Local backend, or Pinecone without its asyncio extra
+            return await asyncio.get_running_loop().run_in_executor(None, lambda: llm.index.query(**kwargs))
+        return await self._index.query(**kwargs)
+
+    async def _open_index(self):
+        if retriever.is_local():
+            return False
+        try:
+            host = config.PINECONE_HOST_OVERRIDE
+            if not host:
+                description = await self.in_thread(retriever.get_pinecone().describe_index, config.DEMO_INDEX_NAME)
+                host = description.host
+            return retriever.get_pinecone().IndexAsyncio(host=host)
+        except ImportError as e:
+            logger.warning(f"Async Pinecone client unavailable ({str(e)}); querying from threads instead")
+            return False
+
+    # -------------------------------
+    # Stages
+    # -------------------------------
+
+    async def embed_text(self, text: str, deadline: Deadline = None):
+        with metrics.timed("embed"):
+            key = llm.query_cache.make_key(text, config.EMBED_MODEL)
+            vector = await self.in_thread(llm.query_cache.get, key)
+            if vector is None:
+                timeout = deadline.timeout(config.EMBED_TIMEOUT) if deadline else NOT_GIVEN
+                with metrics.timed("embed_api"):
+                    response = await self._client(timeout).embeddings.create(model=config.EMBED_MODEL, input=text)
+                metrics.record_usage(config.EMBED_MODEL, response.usage)
+                vector = response.data[0].embedding
+                await self.in_thread(llm.query_cache.put, key, vector)
+            return vector
+
+    async def retrieve(self, query: str, deadline: Deadline = None):
+        """Async llm.retrieve: (embedding, matches)."""
+        try:
+            emb, namespace = await asyncio.gather(
+                self.embed_text(query, deadline),
+                self.in_thread(generations.active_namespace, config.DEMO_INDEX_NAME),
+            )
+            options = {"_request_timeout": deadline.timeout(config.VECTOR_QUERY_TIMEOUT)} if deadline else {}
+            with metrics.timed("vector_query"):
+                result = await self._query_index(
+                    vector=emb,
+                    top_k=getattr(config, "TOP_K", 5),
+                    include_metadata=True,
+                    include_values=False,
+                    namespace=namespace,
+                    **options,
+                )
+            return emb, getattr(result, "matches", []) or []
+        except Exception:
+            metrics.fallbacks.inc(reason="no_retrieval")
+            return None, []
+
+    async def ask_llm(self, messages: list, model_choice: str, timeout=NOT_GIVEN) -> str:
+        started = time.perf_counter()
+        with metrics.timed("completion"):
+            response = await self._client(timeout).chat.completions.create(model=model_choice, messages=messages)
+        return llm.completion_text(response, model_choice, time.perf_counter() - started)
+
+    async def complete(self, messages: list, model_choice: str, deadline: Deadline) -> str:
+        """Async llm.complete; the request that loses to its hedge is cancelled."""
+        call = llm.HedgedCall(model_choice, deadline)
+        pending = {call.track(asyncio.create_task(self.ask_llm(messages, model_choice, call.timeout)))}
+        try:
+            while call.waiting(pending):
+                done, pending = await asyncio.wait(pending, timeout=call.wait_time(),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if call.succeeded(task):
+                        return task.result()
+                hedge = call.hedge(pending)
+                if hedge is not None:
+                    pending.add(asyncio.create_task(self.ask_llm(messages, *hedge)))
+        finally:
+            for task in pending:
+                task.cancel()
+        raise call.failure()
+
+    async def generate(self, message: str, chat_history: list, system_prompt_template: str, model_choice: str = None,
+                       summary: str = None, context: str = None, deadline: Deadline = None,
+                       extra_context: str = None, retrieval=None) -> str:
+        """Async llm.generate; returns only the reply. retrieval is an already running self.retrieve(message)."""
+        deadline = deadline or Deadline(config.REPLY_DEADLINE_SECONDS)
+        try:
+            emb, matches = None, []
+            if context is None:
+                emb, matches = await (retrieval or self.retrieve(message, deadline))
+            prompt = llm.prepare_prompt(message, chat_history, system_prompt_template, model_choice, summary, context,
+                                        extra_context, emb, matches)
+            if prompt.cached is not None:
+                return prompt.cached
+
+            bot_reply = await self.complete(prompt.messages, prompt.model, deadline)
+            llm.store_answer(prompt.emb, prompt.fingerprint, bot_reply)
+            return bot_reply
+        except Exception as e:
+            return llm.fallback_reply(e)
+
+    async def process_message_event(self, event: MessageEvent):
+        """Async whatsapp.process_message_event."""
+        with metrics.timed("reply"):
+            intent, language = (
+                intents.classify(event.type, event.text) if config.INTENT_ROUTER_ENABLED else (None, None)
+            )
+            if intent is None and not event.text:
+                logger.info(f"Ignoring {event.type} message {event.message_id} without text")
+                return
+
+            retrieval = loaded = None
+            if intent is not None:
+                _, claimed = await self.in_thread(whatsapp.claim_message, event, False)
+            else:
+                # Embedding, the vector query and the summary/campaign reads overlap with the claim and
+                # history read; they are dropped if the message was already handled
+                deadline = Deadline(config.REPLY_DEADLINE_SECONDS)
+                retrieval = asyncio.create_task(self.retrieve(event.text, deadline))
+                loaded = asyncio.create_task(
+                    self.in_thread(whatsapp.reply_context, event.text, event.wa_id, event.message_id)
+                )
+                try:
+                    chat_history, claimed = await self.in_thread(whatsapp.claim_message, event, True)
+                except BaseException:
+                    retrieval.cancel()
+                    loaded.cancel()
+                    raise
+                if not claimed:
+                    retrieval.cancel()
+                    loaded.cancel()
+            if not claimed:
+                return
+
+            try:
+                intents.record(intent)
+                if intent is not None:
+                    response = intents.reply_for(intent, language)
+                    logger.info(f"Answered {intent} message {event.message_id} from a template")
+                else:
+                    summary, context, extra_context = await loaded
+                    if context is not None:
+                        # The campaign table answers it on its own
+                        retrieval.cancel()
+                    with metrics.timed("generate"):
+                        response = await self.generate(
+                            event.text, chat_history, config.SYSTEM_PROMPT, llm.reply_model(),
+                            summary, context, deadline, extra_context, retrieval,
+                        )
+                    logger.info(f"AI response before processing: {response}")
+                    response = whatsapp.process_text_for_whatsapp(response)
+
+                await self.in_thread(
+                    whatsapp.deliver_reply, event.wa_id, response, event.phone_number_id, intent is None,
+                    event.message_id,
+                )
+            except BaseException:
+                if retrieval is not None:
+                    retrieval.cancel()
+                await self.in_thread(whatsapp.release_claim, event.message_id)
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "max_inflight": self.max_inflight,
+                "inflight": self._inflight,
+                **self._counts,
+            }
+
+
+pipeline = AsyncPipeline(max_inflight=config.ASYNC_MAX_INFLIGHT, threads=config.ASYNC_DB_THREADS)
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class Deadline:
+    """Latency budget for one reply, shared by every upstream call made for it."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, cap: float = None) -> float:
+        """Seconds the next call may take (at most cap); raises DeadlineExceeded once the budget is spent."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"reply budget of {self.seconds}s exhausted")
+        return min(remaining, cap) if cap else remaining
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies, for picking the hedge delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float, default: float) -> float:
+        """The p-th percentile of the window, or default until min_samples calls were seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return default
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"samples": len(self._samples)}
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while an upstream is erroring.
+
+    Opens when at least error_rate of the last window calls failed (and at
+    least min_calls were made), stays open for cooldown seconds, then lets a
+    single trial call through: success closes it, failure opens it again.
+    """
+
+    def __init__(self, error_rate: float = 0.5, window: int = 20, min_calls: int = 10, cooldown: float = 30.0):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._results = deque(maxlen=window)
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self._counts = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            self._counts["rejected"] += 1
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            if self._opened_at is not None:
+                if self._trial:
+                    self._trial = False
+                    if success:
+                        self._opened_at = None
+                        self._results.clear()
+                    else:
+                        self._opened_at = time.monotonic()
+                return
+
+            self._results.append(success)
+            failures = self._results.count(False)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.error_rate:
+                self._opened_at = time.monotonic()
+                self._counts["opened"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": self._state() != "closed",
+                "recent_calls": len(self._results),
+                "recent_failures": self._results.count(False),
+                **self._counts,
+            }
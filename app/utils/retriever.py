@@ -0,0 +1,69 @@
+import logging
+import os
+import threading
+from functools import lru_cache
+
+import config
+from pinecone import Pinecone, ServerlessSpec
+
+logger = logging.getLogger(__name__)
+
+_local_indexes = {}
+_lock = threading.Lock()
+
+
+def _local_index(index_name: str):
+    # Imported lazily so the Pinecone backend does not need numpy loaded
+    from app.utils.local_index import LocalVectorIndex
+
+    with _lock:
+        index = _local_indexes.get(index_name)
+        if index is None:
+            index = LocalVectorIndex(
+                os.path.join(config.LOCAL_INDEX_PATH, index_name),
+                config.EMBED_DIMENSION,
+                mmap=config.LOCAL_INDEX_MMAP,
+            )
+            _local_indexes[index_name] = index
+        return index
+
+
+@lru_cache(maxsize=1)
+def get_pinecone() -> Pinecone:
+    # Created on first use so the local backend runs without Pinecone credentials
+    return Pinecone(api_key=config.PINECONE_API_KEY)
+
+
+def is_local() -> bool:
+    return config.RETRIEVER_BACKEND == "local"
+
+
+def get_index(index_name: str):
+    """
+    Vector index for index_name on the configured backend
+    (RETRIEVER_BACKEND). Both backends answer the same calls: query,
+    upsert, delete and describe_index_stats.
+    """
+    if is_local():
+        return _local_index(index_name)
+    if config.PINECONE_HOST_OVERRIDE:
+        return get_pinecone().Index(name=index_name, host=config.PINECONE_HOST_OVERRIDE)
+    return get_pinecone().Index(index_name)
+
+
+def has_index(index_name: str) -> bool:
+    if is_local():
+        return os.path.isdir(os.path.join(config.LOCAL_INDEX_PATH, index_name))
+    return get_pinecone().has_index(index_name)
+
+
+def create_index(index_name: str) -> None:
+    if is_local():
+        _local_index(index_name)
+        return
+    get_pinecone().create_index(
+        index_name,
+        dimension=config.EMBED_DIMENSION,
+        metric="cosine",
+        spec=ServerlessSpec(cloud="aws", region="us-east-1")
+    )
@@ -0,0 +1,147 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from app.extensions import db
+from app.models import ConversationSummary, WhatsappMessage
+from app.utils import llm
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _unfolded(user_id: str, last_message_id: int):
+    return (
+        WhatsappMessage.query
+        .filter(WhatsappMessage.user_id == user_id)
+        .filter(WhatsappMessage.id > last_message_id)
+        .filter(WhatsappMessage.text.isnot(None))
+        .filter(WhatsappMessage.text != "")
+    )
+
+
+def _turns(messages: list) -> list:
+    return [{"role": "user" if m.is_received else "assistant", "content": m.text} for m in messages]
+
+
+def get_summary(user_id: str, window: int = 0, exclude_message_id: str = None) -> str:
+    """
+    Stored summary of the user's older messages, followed verbatim by the
+    messages older than the newest window that are not folded into it yet,
+    so no turn is left out of both the summary and the history. The message
+    being answered (exclude_message_id) is not counted in the window. ""
+    if there is nothing older than the window.
+    """
+    row = db.session.get(ConversationSummary, user_id)
+    summary = row.summary if row is not None else ""
+    if not window:
+        return summary
+
+    query = _unfolded(user_id, row.last_message_id if row is not None else 0)
+    if exclude_message_id:
+        query = query.filter(db.or_(
+            WhatsappMessage.wa_message_id.is_(None),
+            WhatsappMessage.wa_message_id != exclude_message_id,
+        ))
+    pending = (
+        query.order_by(WhatsappMessage.id.desc())
+        .offset(window)
+        .limit(config.SUMMARY_FOLD_MAX)
+        .all()
+    )
+    if not pending:
+        return summary
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in _turns(reversed(pending)))
+    return f"{summary}\n\nLater messages, not summarized yet:\n{transcript}".strip()
+
+
+def fold(user_id: str, window: int, min_messages: int, max_messages: int = 50) -> bool:
+    """
+    Fold messages older than the newest window into the user's summary,
+    once at least min_messages of them have accumulated (get_summary sends
+    them verbatim until then). At most the oldest
+    max_messages are folded per call, so a long backlog is caught up over
+    several calls. Returns True if the summary changed.
+    """
+    row = db.session.get(ConversationSummary, user_id)
+    last_message_id = row.last_message_id if row is not None else 0
+
+    with_text = _unfolded(user_id, last_message_id)
+    query = with_text
+    if window:
+        # The newest window messages are still sent verbatim as history
+        newest = with_text.order_by(WhatsappMessage.id.desc()).limit(window).all()
+        if len(newest) < window:
+            return False
+        query = query.filter(WhatsappMessage.id < newest[-1].id)
+
+    older = query.order_by(WhatsappMessage.id).limit(max_messages).all()
+    if len(older) < min_messages:
+        return False
+
+    summary = llm.summarize(row.summary if row is not None else "", _turns(older))
+    if not summary:
+        return False
+
+    if row is None:
+        row = ConversationSummary(user_id=user_id)
+        db.session.add(row)
+    row.summary = summary
+    row.last_message_id = older[-1].id
+    db.session.commit()
+    logger.info(f"Folded {len(older)} messages into the summary for {user_id}")
+    return True
+
+
+class SummaryFolder:
+    """
+    Background executor that updates rolling summaries after replies are
+    sent, so summarization never adds latency to a reply. At most one fold
+    per user runs at a time; requests for a user already being folded are
+    dropped, the next message schedules another.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self._app = None
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._counts = {"scheduled": 0, "folded": 0, "failed": 0}
+
+    def init_app(self, app):
+        self._app = app
+
+    def schedule(self, user_id: str) -> bool:
+        with self._lock:
+            if user_id in self._pending:
+                return False
+            self._pending.add(user_id)
+            self._counts["scheduled"] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summary")
+        self._executor.submit(self._run, user_id)
+        return True
+
+    def _run(self, user_id: str):
+        try:
+            with self._app.app_context(), metrics.timed("summary_fold"):
+                folded = fold(user_id, config.HISTORY_WINDOW, config.SUMMARY_FOLD_MIN, config.SUMMARY_FOLD_MAX)
+            if folded:
+                with self._lock:
+                    self._counts["folded"] += 1
+        except Exception as e:
+            with self._lock:
+                self._counts["failed"] += 1
+            logger.error(f"Failed to update summary for {user_id}: {str(e)}", exc_info=True)
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), **self._counts}
+
+
+folder = SummaryFolder(workers=config.SUMMARY_WORKERS)
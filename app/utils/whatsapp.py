@@ -1,14 +1,29 @@
 import logging
 from flask import jsonify
 import requests
+from app.utils import campaigns
+from app.utils import http
+from app.utils import intents
 from app.utils import llm
+from app.utils import metrics
+from app.utils import outbox
+from app.utils import summaries
+from app.utils.ingest import MessageEvent
+from app.utils.dedup import RecentIds
+from app.utils.history import HistoryCache
 from app.models import WhatsappMessage
 from app.extensions import db
+from sqlalchemy.exc import IntegrityError
 
 import re
+import time
+from datetime import datetime, timedelta
 
 import config
 
+history_cache = HistoryCache(window=config.HISTORY_WINDOW, max_users=config.HISTORY_CACHE_USERS)
+recent_message_ids = RecentIds(ttl=config.DEDUP_TTL, max_size=config.DEDUP_MAX_IDS)
+
 
 def log_http_response(response):
     logging.info(f"Status: {response.status_code}")
@@ -25,9 +40,38 @@ def get_text_message_input(recipient, text):
     }
 
 
-def generate_response(req,wa_id):
-    chat_history = retrieve_user_message_as_history(wa_id)
-    _, response = llm.generate(req, chat_history, config.SYSTEM_PROMPT, config.CHAT_MODEL)
+def reply_context(req, wa_id, message_id=None):
+    """
+    Returns (summary, context, extra_context): the user's conversation
+    summary (with turns older than the history window that are not folded
+    yet), the campaign-table context when it answers req on its own (None
+    means use retrieval), and campaign rows to add to the retrieved context.
+    message_id is req's own WhatsApp id, left out of the history window.
+    """
+    summary = summaries.get_summary(wa_id, config.HISTORY_WINDOW, message_id) if config.SUMMARY_ENABLED else None
+    context, extra_context = None, None
+    if config.CAMPAIGN_FAST_PATH_ENABLED:
+        try:
+            with metrics.timed("campaign_lookup"):
+                structured, exclusive = campaigns.fast_context(req)
+            if exclusive:
+                context = structured
+            else:
+                extra_context = structured
+        except Exception as e:
+            metrics.fallbacks.inc(reason="campaign_lookup_failed")
+            logging.error(f"Campaign lookup failed, falling back to retrieval: {str(e)}")
+    return summary, context, extra_context
+
+
+@metrics.timed("generate")
+def generate_response(req, wa_id, chat_history=None, message_id=None):
+    if chat_history is None:
+        chat_history = retrieve_user_message_as_history(wa_id)
+    summary, context, extra_context = reply_context(req, wa_id, message_id)
+    _, response = llm.generate(
+        req, chat_history, config.SYSTEM_PROMPT, llm.reply_model(), summary, context, extra_context=extra_context
+    )
     return response
 
 
@@ -37,18 +81,15 @@ def send_message(data) -> bool:
         "Authorization": f"Bearer {config.WHATSAPP_ACCESS_TOKEN}",
     }
 
-    url = f"https://graph.facebook.com/{config.WHATSAPP_API_VERSION}/{config.WHATSAPP_PHONE_NUMBER_ID}/messages"
+    url = f"{config.GRAPH_API_BASE_URL}/{config.WHATSAPP_API_VERSION}/{config.WHATSAPP_PHONE_NUMBER_ID}/messages"
 
     try:
-        response = requests.post(
-            url, json=data, headers=headers, timeout=10
-        )  # 10 seconds timeout as an example
-        response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
+        with metrics.timed("send"):
+            response = http.post(url, json=data, headers=headers)
+            response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
 
         # Save bot message to DB
-        bot_message = WhatsappMessage(user_id=data["to"], text=data["text"]["body"], is_received=False)
-        db.session.add(bot_message)
-        db.session.commit()
+        save_message(data["to"], data["text"]["body"], is_received=False)
 
 
     except requests.Timeout:
@@ -84,57 +125,179 @@ def process_text_for_whatsapp(text):
     return whatsapp_style_text
 
 
-def process_whatsapp_message(body):
-    wa_id = body["entry"][0]["changes"][0]["value"]["contacts"][0]["wa_id"]
-    name = body["entry"][0]["changes"][0]["value"]["contacts"][0]["profile"]["name"]
+@metrics.timed("reply")
+def process_message_event(event: MessageEvent):
+    """Generate and send the reply to one inbound message."""
+    wa_id = event.wa_id
+    message_body = event.text
+
+    # Greetings, thanks, emojis and media are answered from templates without retrieval
+    intent, language = intents.classify(event.type, message_body) if config.INTENT_ROUTER_ENABLED else (None, None)
+    if intent is None and not message_body:
+        logging.info(f"Ignoring {event.type} message {event.message_id} without text")
+        return
 
-    message = body["entry"][0]["changes"][0]["value"]["messages"][0]
-    message_body = message["text"]["body"]
+    chat_history, claimed = claim_message(event, with_history=intent is None)
+    if not claimed:
+        return
 
-    # Generate AI response
-    response = generate_response(message_body, wa_id)
-    logging.info(f"AI response before processing: {response}")
+    try:
+        intents.record(intent)
+        if intent is not None:
+            response = intents.reply_for(intent, language)
+            logging.info(f"Answered {intent} message {event.message_id} from a template")
+        else:
+            # Generate AI response
+            response = generate_response(message_body, wa_id, chat_history, event.message_id)
+            logging.info(f"AI response before processing: {response}")
+
+            # Process styling for WhatsApp
+            response = process_text_for_whatsapp(response)
+
+        # Append AI attribution
+        # response += "\n\n_(Replied by AI)_"
+
+        deliver_reply(wa_id, response, event.phone_number_id, summarize=intent is None, message_id=event.message_id)
+    except BaseException:
+        db.session.rollback()
+        release_claim(event.message_id)
+        raise
+
+
+def claim_message(event: MessageEvent, with_history: bool = True):
+    """
+    Read the user's history (before this message is part of it), then save
+    the message. The unique message id makes the save the claim on it; a
+    re-delivery takes the claim over only if the earlier reply failed
+    (release_claim) or was abandoned for REPLY_CLAIM_SECONDS.
+    Returns (history or None, claimed).
+    """
+    chat_history = retrieve_user_message_as_history(event.wa_id) if with_history else None
 
     # Save user message to DB
-    user_message = WhatsappMessage(user_id=wa_id, text=message_body, is_received=True)
-    db.session.add(user_message)
+    claimed_until = datetime.utcnow() + timedelta(seconds=config.REPLY_CLAIM_SECONDS) if event.message_id else None
+    if save_message(event.wa_id, event.text, is_received=True, wa_message_id=event.message_id,
+                    claimed_until=claimed_until):
+        return chat_history, True
+
+    if take_over_claim(event.message_id, claimed_until):
+        logging.info(f"Retrying message {event.message_id}, its earlier reply was not handed off")
+        # The message is already stored, so a fresh history read may end with it
+        if chat_history and chat_history[-1] == {"role": "user", "content": event.text}:
+            chat_history = chat_history[:-1]
+        return chat_history, True
+
+    logging.info(f"Skipping already processed message {event.message_id}")
+    recent_message_ids.count_duplicate()
+    return chat_history, False
+
+
+def take_over_claim(message_id: str, claimed_until: datetime) -> bool:
+    """Compare-and-set the claim on a stored message whose reply failed or expired."""
+    updated = (
+        WhatsappMessage.query
+        .filter(
+            WhatsappMessage.wa_message_id == message_id,
+            WhatsappMessage.claimed_until.isnot(None),
+            WhatsappMessage.claimed_until <= datetime.utcnow(),
+        )
+        .update({"claimed_until": claimed_until}, synchronize_session=False)
+    )
     db.session.commit()
+    return bool(updated)
 
-    # Process styling for WhatsApp
-    response = process_text_for_whatsapp(response)
 
-    # Append AI attribution
-    # response += "\n\n_(Replied by AI)_"
+def release_claim(message_id: str):
+    """Let the next re-delivery of a message whose reply failed take it over at once."""
+    if message_id is None:
+        return
+    try:
+        (
+            WhatsappMessage.query
+            .filter(WhatsappMessage.wa_message_id == message_id, WhatsappMessage.claimed_until.isnot(None))
+            .update({"claimed_until": datetime.utcnow()}, synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Failed to release the claim on {message_id}, it expires on its own: {str(e)}")
+    recent_message_ids.discard(message_id)
 
-    data = get_text_message_input(wa_id, response)
 
-    send_message(data)
+def _settle_claim(message_id: str):
+    # Staged in the caller's transaction; None means the message was answered
+    if message_id is not None:
+        (
+            WhatsappMessage.query
+            .filter(WhatsappMessage.wa_message_id == message_id)
+            .update({"claimed_until": None}, synchronize_session=False)
+        )
 
 
+def deliver_reply(wa_id: str, response: str, phone_number_id: str = None, summarize: bool = True,
+                  message_id: str = None):
+    """Hand off the reply to message_id (if known), settling its claim in the same commit."""
+    data = get_text_message_input(wa_id, response)
+
+    if config.OUTBOX_ENABLED:
+        # Sent (and retried) by the outbox senders. The bot message is committed with its outbox row,
+        # so the next turn sees it while the send is still pending; the outbox only tracks delivery
+        db.session.add(WhatsappMessage(user_id=wa_id, text=response, is_received=False))
+        _settle_claim(message_id)
+        outbox.sender.enqueue(data, phone_number_id=phone_number_id)
+        history_cache.append(wa_id, "assistant", response)
+    else:
+        send_message(data)
+        _settle_claim(message_id)
+        db.session.commit()
+
+    if config.SUMMARY_ENABLED and summarize:
+        summaries.folder.schedule(wa_id)
 
 
-def is_valid_whatsapp_message(body):
+def save_message(user_id: str, text: str, is_received: bool, wa_message_id: str = None,
+                 claimed_until: datetime = None) -> bool:
     """
-    Check if the incoming webhook event has a valid WhatsApp message structure.
+    Persist a message and keep the user's cached history window in sync.
+    Returns False if a message with the same wa_message_id was already stored.
     """
-    return (
-        body.get("object")
-        and body.get("entry")
-        and body["entry"][0].get("changes")
-        and body["entry"][0]["changes"][0].get("value")
-        and body["entry"][0]["changes"][0]["value"].get("messages")
-        and body["entry"][0]["changes"][0]["value"]["messages"][0]
+    message = WhatsappMessage(
+        user_id=user_id, text=text, is_received=is_received, wa_message_id=wa_message_id, claimed_until=claimed_until
     )
+    db.session.add(message)
+    started = time.perf_counter()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    finally:
+        metrics.stage_seconds.observe(time.perf_counter() - started, stage="db_commit")
+    history_cache.append(user_id, "user" if is_received else "assistant", text)
+    return True
 
 
+@metrics.timed("history")
 def retrieve_user_message_as_history(user_id: str):
-    messages = WhatsappMessage.query.filter_by(user_id=user_id)
+    """Return the newest HISTORY_WINDOW messages for a user, oldest first."""
+    cached = history_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    messages = (
+        WhatsappMessage.query
+        .filter(WhatsappMessage.user_id == user_id)
+        .filter(WhatsappMessage.text.isnot(None))
+        .filter(WhatsappMessage.text != "")
+        .order_by(WhatsappMessage.created_at.desc(), WhatsappMessage.id.desc())
+        .limit(config.HISTORY_WINDOW)
+        .all()
+    )
     message_history = []
 
-    for message in messages:
+    for message in reversed(messages):
         role = "user" if message.is_received else "assistant"
-        content = message.text if message.text else ""
-        if content:
-            message_history.append({"role": role, "content": content})
+        message_history.append({"role": role, "content": message.text})
 
+    history_cache.load(user_id, message_history)
     return message_history
\ No newline at end of file
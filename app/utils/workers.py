@@ -0,0 +1,115 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWorkerPool:
+    """
+    Background pool that processes webhook messages off the request thread.
+
+    Each worker owns its own queue and every wa_id is always routed to the
+    same worker, so replies for one user are generated and sent in the order
+    their messages arrived while different users are handled in parallel.
+    """
+
+    def __init__(self, size: int = 4, queue_size: int = 100):
+        self.size = size
+        self.queue_size = queue_size
+        self._app = None
+        self._handler = None
+        self._queues = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def init_app(self, app, handler):
+        """Bind the pool to a Flask app and the function that handles a message."""
+        self._app = app
+        self._handler = handler
+
+    @property
+    def started(self) -> bool:
+        return bool(self._threads)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.size)]
+            threads = [
+                threading.Thread(target=self._run, args=(q,), name=f"wa-worker-{i}", daemon=True)
+                for i, q in enumerate(queues)
+            ]
+            for t in threads:
+                t.start()
+            # Published together and only once every worker runs; submit() reads them without the lock
+            self._queues, self._threads = queues, threads
+        logger.info(f"Started {self.size} message workers (queue size {self.queue_size})")
+
+    def _shard(self, wa_id: str) -> int:
+        return zlib.crc32(wa_id.encode("utf-8")) % self.size
+
+    def submit(self, wa_id: str, payload) -> bool:
+        """
+        Queue a payload for the worker owning wa_id.
+        Returns False if that worker's queue is full.
+        """
+        queues = self._queues
+        if not queues:
+            self.start()
+            queues = self._queues
+
+        q = queues[self._shard(wa_id)]
+        try:
+            q.put_nowait((time.monotonic(), payload))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"Worker queue full, rejecting message from {wa_id}")
+            return False
+
+        with self._lock:
+            self._submitted += 1
+        return True
+
+    def _run(self, q: queue.Queue):
+        while True:
+            enqueued_at, payload = q.get()
+            waited = time.monotonic() - enqueued_at
+            metrics.stage_seconds.observe(waited, stage="queue_wait")
+            try:
+                with self._app.app_context():
+                    self._handler(payload)
+                with self._lock:
+                    self._processed += 1
+            except Exception as e:
+                with self._lock:
+                    self._failed += 1
+                logger.error(f"Failed to process queued message: {str(e)}", exc_info=True)
+            finally:
+                logger.debug(f"Message waited {waited:.3f}s in queue")
+                q.task_done()
+
+    def stats(self) -> dict:
+        depths = [q.qsize() for q in self._queues]
+        with self._lock:
+            return {
+                "workers": self.size,
+                "started": self.started,
+                "queue_size": self.queue_size,
+                "queue_depth": sum(depths),
+                "queue_depths": depths,
+                "submitted": self._submitted,
+                "processed": self._processed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
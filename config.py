@@ -7,11 +7,90 @@ load_dotenv()
 INDEX_NAME = "web-data"
 DEMO_INDEX_NAME = "testo-1"
 EMBED_MODEL = "text-embedding-3-small"
+EMBED_DIMENSION = 1536
+# Content-addressed on-disk store of document embeddings reused across syncs; empty disables it
+EMBED_STORE_PATH = os.getenv("EMBED_STORE_PATH", "./embedding-store")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))  # inputs per embeddings request
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))  # estimated tokens per request
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "5000"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")  # SQLite file; unset keeps the cache in memory only
 CHAT_MODEL = "gpt-3.5-turbo"
+# Opt-in: route each WhatsApp reply to FAST_MODEL, or to STRONG_MODEL once its complexity score (0-1)
+# reaches ROUTER_THRESHOLD; while disabled every reply uses CHAT_MODEL
+MODEL_ROUTER_ENABLED = os.getenv("MODEL_ROUTER_ENABLED", "false").lower() == "true"
+FAST_MODEL = os.getenv("FAST_MODEL", "gpt-4o-mini")
+STRONG_MODEL = os.getenv("STRONG_MODEL", "gpt-4o")
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.5"))
+ROUTER_LONG_WORDS = int(os.getenv("ROUTER_LONG_WORDS", "40"))  # message length scored as fully complex
+ROUTER_CONFIDENT_SCORE = float(os.getenv("ROUTER_CONFIDENT_SCORE", "0.6"))  # top match score scored as fully grounded
+ROUTER_WEAK_SCORE = float(os.getenv("ROUTER_WEAK_SCORE", "0.3"))  # top match score scored as ungrounded
+ROUTER_DEEP_MESSAGES = int(os.getenv("ROUTER_DEEP_MESSAGES", "8"))  # prior messages scored as a fully deep conversation
+
+# Reuse answers for near-identical first questions over the same retrieved context
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity of query embeddings
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+
+# Per-reply latency budget shared by embedding, vector search and the completion
+REPLY_DEADLINE_SECONDS = float(os.getenv("REPLY_DEADLINE_SECONDS", "20"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "5"))  # cap per embeddings call within the budget
+VECTOR_QUERY_TIMEOUT = float(os.getenv("VECTOR_QUERY_TIMEOUT", "5"))
+# A second completion is sent when the first is slower than this percentile of recent completions
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2"))  # seconds; also the delay until enough samples exist
+HEDGE_MODEL = os.getenv("HEDGE_MODEL")  # e.g. a faster model for the hedge; unset reuses the reply's model
+COMPLETION_WORKERS = int(os.getenv("COMPLETION_WORKERS", "32"))  # threads for completion requests and their hedges
+# Completions fail fast to FALLBACK_REPLY while this share of the last CIRCUIT_WINDOW calls failed
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))  # seconds before a trial call is let through
+FALLBACK_REPLY = os.getenv(
+    "FALLBACK_REPLY",
+    "Maaf, sistem kami sedang sibuk. Sila cuba lagi sebentar lagi. "
+    "Sorry, we are having trouble answering right now, please try again shortly.",
+)
+
 TOP_K = 3
+# Retrieved chunks are packed into the prompt up to this many tokens of CHAT_MODEL
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # shingle Jaccard similarity
+
+# "pinecone", or "local" for the in-process NumPy index stored under LOCAL_INDEX_PATH
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "pinecone")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./local-index")
+LOCAL_INDEX_MMAP = os.getenv("LOCAL_INDEX_MMAP", "true").lower() == "true"
+
+# Sync builds each index refresh into a new namespace ("generation") and flips readers to it once validated
+GENERATION_PREFIX = "gen-"
+GENERATION_CACHE_SECONDS = int(os.getenv("GENERATION_CACHE_SECONDS", "30"))
+GENERATION_VALIDATE_TIMEOUT = int(os.getenv("GENERATION_VALIDATE_TIMEOUT", "120"))
+
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "4"))
+HISTORY_CACHE_USERS = int(os.getenv("HISTORY_CACHE_USERS", "10000"))
+
+# Answer greetings, thanks, emoji-only and media messages from templates, skipping retrieval and the LLM
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+
+# Answer factual campaign/pay questions from the structured campaign table instead of vector search
+CAMPAIGN_FAST_PATH_ENABLED = os.getenv("CAMPAIGN_FAST_PATH_ENABLED", "true").lower() == "true"
+CAMPAIGN_FAST_PATH_LIMIT = int(os.getenv("CAMPAIGN_FAST_PATH_LIMIT", "10"))
+CAMPAIGN_VOCAB_SECONDS = int(os.getenv("CAMPAIGN_VOCAB_SECONDS", "60"))  # how often known locations/brands reload
+
+# Turns older than HISTORY_WINDOW are folded into a per-user rolling summary off the reply path
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", CHAT_MODEL)
+SUMMARY_FOLD_MIN = int(os.getenv("SUMMARY_FOLD_MIN", "6"))  # older messages to collect before folding
+SUMMARY_FOLD_MAX = int(os.getenv("SUMMARY_FOLD_MAX", "50"))  # oldest messages folded per call; backlogs catch up over several
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "150"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
 
 SERVICE_ACCOUNT_FILE= "./service-account.json"
 GOOGLE_DRIVE_FOLDER_ID = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
+DRIVE_EXPORT_CONCURRENCY = int(os.getenv("DRIVE_EXPORT_CONCURRENCY", "4"))  # parallel exports; keep within Drive quota
+DRIVE_NUM_RETRIES = int(os.getenv("DRIVE_NUM_RETRIES", "3"))  # backoff retries on rate limits and 5xx
 
 SYSTEM_PROMPT = """You are a community manager for carching's users who are car owners and drivers. 
 Use the following information to answer the user's question. If you don't know the answer, say you'll find out.
@@ -33,4 +112,52 @@ WHATSAPP_APP_ID = os.getenv("WHATSAPP_APP_ID")
 WHATSAPP_APP_SECRET = os.getenv("WHATSAPP_APP_SECRET")
 
 FRIDAY_API_URL = os.getenv("FRIDAY_API_URL")
+
+# Bearer token required by POST /sync and /sync/rollback; while unset both are refused
+SYNC_API_KEY = os.getenv("SYNC_API_KEY")
+
+# Service endpoints; overridden to point the app at local stand-ins (scripts/benchmark.py)
+GRAPH_API_BASE_URL = os.getenv("GRAPH_API_BASE_URL") or "https://graph.facebook.com"
+# An empty OPENAI_BASE_URL counts as unset; passing None would make the SDK read the empty variable itself
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+PINECONE_HOST_OVERRIDE = os.getenv("PINECONE_HOST_OVERRIDE") or None  # data-plane host used for every index
+
+# Shared keep-alive HTTP session for Graph API and Friday calls
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # hosts with a cached pool
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))  # connections kept per host
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))  # on connection errors and 429; GETs also on read errors and 5xx
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_TIMEOUTS = {  # read timeouts by host
+    "graph.facebook.com": float(os.getenv("GRAPH_READ_TIMEOUT", "10")),
+}
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Acknowledge webhooks immediately and generate replies on background workers
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "false").lower() == "true"
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "4"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "100"))
+
+# Generate replies on one asyncio event loop with async OpenAI/Pinecone clients (takes precedence over WEBHOOK_ASYNC)
+PIPELINE_ASYNC = os.getenv("PIPELINE_ASYNC", "false").lower() == "true"
+ASYNC_MAX_INFLIGHT = int(os.getenv("ASYNC_MAX_INFLIGHT", "500"))  # replies in progress before webhooks get 503
+ASYNC_DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", "16"))  # threads for DB and other blocking calls
+
+# Remember inbound message ids so webhook re-deliveries are acknowledged without reprocessing
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", "86400"))
+DEDUP_MAX_IDS = int(os.getenv("DEDUP_MAX_IDS", "100000"))
+# A claimed message whose reply was not handed off within this long (crash) is taken over by its next re-delivery
+REPLY_CLAIM_SECONDS = int(os.getenv("REPLY_CLAIM_SECONDS", "120"))
+
+# Durable outbox for replies: rows are drained by sender threads with retries and per-number rate limiting
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "true").lower() == "true"
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "10"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))  # seconds between idle polls
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))  # claimed rows are retried after this
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF = float(os.getenv("OUTBOX_BACKOFF", "2.0"))  # first retry delay, doubled per attempt
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", "20"))  # messages per second per phone number, per app instance
+OUTBOX_BURST = int(os.getenv("OUTBOX_BURST", "20"))
@@ -1,16 +1,25 @@
 import os
 import streamlit as st
 from openai import OpenAI
-from pinecone import Pinecone
 
 import config
+from app import create_app
+from app.utils import generations
+from app.utils import llm
+from app.utils import retriever
 
 st.set_page_config(page_title="Carching Support", page_icon="🚗")
 
+
+@st.cache_resource
+def get_flask_app():
+    # Needed for DB-backed lookups such as the active index generation
+    return create_app()
+
+
 try:
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
-    pc = Pinecone(api_key=config.PINECONE_API_KEY)
-    index = pc.Index(config.DEMO_INDEX_NAME)
+    client = OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL)
+    index = retriever.get_index(config.DEMO_INDEX_NAME)
 except Exception as e:
     st.error(f"Failed to initialize services: {str(e)}")
     st.stop()
@@ -33,53 +42,28 @@ if st.sidebar.button("🗑️ Clear Chat"):
 
 def retrieve_context(query: str) -> str:
     try:
-        # Embed the query
-        emb = client.embeddings.create(
-            model=config.EMBED_MODEL,
-            input=query
-        ).data[0].embedding
+        # Embed the query (shares the app's query-embedding cache)
+        emb = llm.embed_text(query)
 
-        # Query Pinecone for nearest chunks
+        with get_flask_app().app_context():
+            active_namespace = generations.active_namespace(config.DEMO_INDEX_NAME)
+
+        # Query the vector index for nearest chunks
         result = index.query(
             vector=emb,
             top_k=getattr(config, "TOP_K", 5),
             include_metadata=True,
             include_values=False,
-            namespace=getattr(config, "NAMESPACE", None)
+            namespace=active_namespace
         )
 
         matches = getattr(result, "matches", []) or []
         if not matches:
             return ""
 
-        min_score = getattr(config, "MIN_SCORE", 0.0)
-        max_chars = getattr(config, "MAX_CONTEXT_CHARS", 8000)
-
-        # Build compact, provenance-rich context
-        contexts = []
-        total = 0
-        for m in matches:
-            score = getattr(m, "score", None)
-            if score is not None and score < min_score:
-                continue
-
-            meta = m.metadata or {}
-            text = meta.get("text") or ""
-            if not text:
-                continue
-
-            file_name = meta.get("file_name", "")
-            chunk_num = meta.get("chunk_num")
-            header = f"Source: {file_name}" + (f" (chunk {chunk_num})" if chunk_num is not None else "")
-            snippet = f"{header}\n{text}" if header.strip() else text
-
-            if total + len(snippet) > max_chars:
-                break
-
-            contexts.append(snippet)
-            total += len(snippet)
-
-        return "\n\n---\n\n".join(contexts)
+        # Same token-budgeted, de-duplicated packing as the WhatsApp bot
+        context, _ = llm.assemble_context(matches, model_choice)
+        return context
     except Exception as e:
         st.warning(f"Couldn't retrieve context: {str(e)}")
         return ""
@@ -0,0 +1,311 @@
+"""
+Webhook load test against local service stand-ins.
+
+Starts the mock OpenAI, Pinecone and Graph API servers (scripts/mock_services.py),
+starts the Flask app pointed at them (or targets an already running one with
+--target), then replays signed synthetic webhook deliveries at a fixed rate and
+reports latency percentiles, throughput and errors as JSON.
+
+Two latencies are measured per message, both from its scheduled send time so a
+slow app cannot hide queueing delay (no coordinated omission):
+  webhook     until the webhook POST is answered
+  end_to_end  until the reply reaches the mock Graph API
+
+  python -m scripts.benchmark --rate 20 --duration 30 --output bench.json
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from scripts.mock_services import MockServices, add_latency_args, latencies_from_args
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MESSAGES = [
+    "Campaign apa ada kat Penang?",
+    "Berapa bayaran bulan ni?",
+    "Macam mana nak join campaign?",
+    "How do I get paid?",
+    "Bila payment masuk?",
+    "hi",
+    "ok tq",
+    "Kenapa sticker kena tukar?",
+]
+
+BENCH_PHONE_NUMBER_ID = "100000000000001"
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(values)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+    return {
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+def webhook_payload(wa_id: str, text: str) -> dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "bench",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "60300000000", "phone_number_id": BENCH_PHONE_NUMBER_ID},
+                    "contacts": [{"profile": {"name": "Bench User"}, "wa_id": wa_id}],
+                    "messages": [{
+                        "from": wa_id,
+                        "id": f"wamid.bench-{uuid.uuid4().hex}",
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }
+
+
+def sign(body: bytes, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode("latin-1"), body, hashlib.sha256).hexdigest()
+
+
+class ReplyTracker:
+    """Matches replies seen by the mock Graph API to the messages that caused them, per user in order."""
+
+    def __init__(self):
+        self._pending = defaultdict(deque)
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.unmatched = 0
+
+    def expect(self, wa_id: str, scheduled_at: float):
+        with self._lock:
+            self._pending[wa_id].append(scheduled_at)
+
+    def forget(self, wa_id: str, scheduled_at: float):
+        with self._lock:
+            try:
+                self._pending[wa_id].remove(scheduled_at)
+            except ValueError:
+                pass
+
+    def on_graph_message(self, recipient: str, payload: dict):
+        now = time.monotonic()
+        with self._lock:
+            queue = self._pending.get(recipient)
+            if not queue:
+                self.unmatched += 1
+                return
+            self.latencies.append(now - queue.popleft())
+
+    def outstanding(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._pending.values())
+
+
+def start_app(host: str, port: int, env: dict):
+    """Import and serve the Flask app in this process with env applied first."""
+    os.environ.update(env)
+    # config reads the environment at import time, so nothing from the app is imported before this point
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from app.models import upgrade_schema
+
+    app = create_app()
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    with app.app_context():
+        upgrade_schema()
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    tracker = ReplyTracker()
+    mocks = MockServices(latencies=latencies_from_args(args), on_graph_message=tracker.on_graph_message)
+    mocks.start()
+
+    secret = os.environ.get("WHATSAPP_APP_SECRET") or "bench-secret"
+    server = None
+    if args.target:
+        target = args.target.rstrip("/")
+        print(f"Point the app at the mocks with: {' '.join(f'{k}={v}' for k, v in mocks.env().items())}", file=sys.stderr)
+    else:
+        env = {
+            **mocks.env(),
+            "WHATSAPP_APP_SECRET": secret,
+            "WHATSAPP_PHONE_NUMBER_ID": BENCH_PHONE_NUMBER_ID,
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "bench",
+            "PINECONE_API_KEY": os.environ.get("PINECONE_API_KEY") or "bench",
+            "WEBHOOK_ASYNC": "true" if args.async_webhook else "false",
+            "PIPELINE_ASYNC": "true" if args.async_pipeline else "false",
+        }
+        if not os.environ.get("DATABASE_URL") or args.fresh_db:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')}"
+        server, target = start_app("127.0.0.1", 0, env)
+
+    messages = DEFAULT_MESSAGES
+    if args.messages:
+        with open(args.messages, encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+
+    total = int(args.rate * args.duration)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    results = []
+    results_lock = threading.Lock()
+
+    def send(i: int, scheduled_at: float):
+        wa_id = f"6019{i % args.users:08d}"
+        body = json.dumps(webhook_payload(wa_id, messages[i % len(messages)])).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Hub-Signature-256": sign(body, secret)}
+        tracker.expect(wa_id, scheduled_at)
+        status, error = None, None
+        try:
+            status = session.post(f"{target}/whatsapp/webhook", data=body, headers=headers, timeout=args.timeout).status_code
+        except requests.RequestException as e:
+            error = type(e).__name__
+        latency = time.monotonic() - scheduled_at
+        if status != 200:
+            tracker.forget(wa_id, scheduled_at)
+        with results_lock:
+            results.append((latency, status, error))
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for i in range(total):
+            scheduled_at = started + i / args.rate
+            delay = scheduled_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, i, scheduled_at)
+    sent_elapsed = time.monotonic() - started
+
+    drain_deadline = time.monotonic() + args.drain
+    while tracker.outstanding() and time.monotonic() < drain_deadline:
+        time.sleep(0.1)
+    elapsed = time.monotonic() - started
+
+    ok = [latency for latency, status, _ in results if status == 200]
+    status_codes = defaultdict(int)
+    errors = defaultdict(int)
+    for _, status, error in results:
+        if error:
+            errors[error] += 1
+        else:
+            status_codes[str(status)] += 1
+
+    report = {
+        "revision": git_revision(),
+        "config": {
+            "target": target,
+            "rate": args.rate,
+            "duration": args.duration,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "async_webhook": args.async_webhook,
+            "async_pipeline": args.async_pipeline,
+            "latency": {
+                "embeddings": args.embed_latency,
+                "chat": args.chat_latency,
+                "pinecone": args.pinecone_latency,
+                "graph": args.graph_latency,
+                "jitter": args.jitter,
+            },
+        },
+        "webhook": {
+            "requests": len(results),
+            "ok": len(ok),
+            "errors": len(results) - len(ok),
+            "status_codes": dict(status_codes),
+            "exceptions": dict(errors),
+            "throughput_rps": round(len(ok) / sent_elapsed, 2) if sent_elapsed else None,
+            "latency_ms": percentiles(ok),
+        },
+        "end_to_end": {
+            "replies": len(tracker.latencies),
+            "missing": tracker.outstanding(),
+            "unmatched": tracker.unmatched,
+            "throughput_rps": round(len(tracker.latencies) / elapsed, 2) if elapsed else None,
+            "latency_ms": percentiles(tracker.latencies),
+        },
+        "mock_requests": mocks.stats(),
+    }
+
+    if server is not None:
+        server.shutdown()
+    mocks.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay signed webhook deliveries and report latency")
+    parser.add_argument("--target", help="base URL of a running app; default starts one in-process")
+    parser.add_argument("--rate", type=float, default=10.0, help="webhook deliveries per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    parser.add_argument("--users", type=int, default=1000, help="distinct wa_ids to cycle through")
+    parser.add_argument("--concurrency", type=int, default=64, help="max in-flight webhook requests")
+    parser.add_argument("--timeout", type=float, default=60.0, help="webhook request timeout in seconds")
+    parser.add_argument("--drain", type=float, default=30.0, help="seconds to wait for outstanding replies")
+    parser.add_argument("--messages", help="file with one message text per line")
+    parser.add_argument("--async-webhook", action="store_true", help="run the in-process app with WEBHOOK_ASYNC=true")
+    parser.add_argument("--async-pipeline", action="store_true", help="run the in-process app with PIPELINE_ASYNC=true")
+    parser.add_argument("--fresh-db", action="store_true", help="use a throwaway SQLite database even if DATABASE_URL is set")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--max-p95-ms", type=float, help="exit non-zero if end-to-end p95 exceeds this")
+    add_latency_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    report = run(args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    p95 = report["end_to_end"]["latency_ms"]["p95"]
+    if args.max_p95_ms is not None and (p95 is None or p95 > args.max_p95_ms):
+        print(f"End-to-end p95 {p95} ms exceeds {args.max_p95_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
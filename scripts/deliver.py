@@ -5,7 +5,7 @@ import config
 RECIPIENT_ID = "959987304010"
 
 async def deliver_test_message():
-    url = f"https://graph.facebook.com/{config.WHATSAPP_API_VERSION}/{config.WHATSAPP_PHONE_NUMBER_ID}/messages"
+    url = f"{config.GRAPH_API_BASE_URL}/{config.WHATSAPP_API_VERSION}/{config.WHATSAPP_PHONE_NUMBER_ID}/messages"
     headers = {
         "Authorization": f"Bearer {config.WHATSAPP_ACCESS_TOKEN}",
         "Content-Type": "application/json"
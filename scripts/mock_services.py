@@ -0,0 +1,268 @@
+"""
+Local stand-ins for the external services the webhook path calls, for benchmarks.
+
+  OpenAI    POST /v1/embeddings, POST /v1/chat/completions
+  Pinecone  POST /query, POST /describe_index_stats
+  Graph     POST /<version>/<phone_number_id>/messages
+
+Every endpoint sleeps for its configured latency (plus jitter) before
+answering, and GET /__stats on any server returns its request counts.
+
+Run on their own:  python -m scripts.mock_services --print-env
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+MOCK_CHUNKS = [
+    "Campaign: Grab Wrap KL\nBrand: Grab\nLocation: Kuala Lumpur\nPay per month: 300\nMax drivers: 50",
+    "Bayaran dibuat setiap bulan selepas gambar odometer dan sticker disahkan oleh team Carching.",
+    "To join a campaign, register in the Carching app, upload your car details and wait for approval.",
+]
+
+
+@dataclass
+class Latency:
+    """Seconds to sleep per request: mean plus or minus jitter (a fraction of the mean)."""
+    mean: float = 0.0
+    jitter: float = 0.2
+
+    def sleep(self):
+        if self.mean > 0:
+            time.sleep(max(0.0, random.uniform(self.mean * (1 - self.jitter), self.mean * (1 + self.jitter))))
+
+
+@dataclass
+class MockState:
+    latencies: dict = field(default_factory=dict)
+    counts: dict = field(default_factory=dict)
+    on_graph_message: object = None  # callback(recipient, payload) for every Graph send
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def count(self, endpoint: str):
+        with self.lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def wait(self, endpoint: str):
+        self.latencies.get(endpoint, Latency()).sleep()
+
+
+def fake_embedding(text: str, dim: int) -> list:
+    """Deterministic unit-ish vector for text, so equal inputs embed identically."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    return [rng.gauss(0.0, 1.0) / dim ** 0.5 for _ in range(dim)]
+
+
+def _handler(state: MockState, routes: dict):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up on the request (timed out, or a cancelled hedge)
+                logger.debug(f"Client disconnected before the {self.path} reply was sent")
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                with state.lock:
+                    return self._reply(200, dict(state.counts))
+            self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._reply(400, {"error": "invalid json"})
+
+            path = self.path.split("?", 1)[0]
+            for suffix, (endpoint, handle) in routes.items():
+                if path.endswith(suffix):
+                    state.count(endpoint)
+                    state.wait(endpoint)
+                    return self._reply(200, handle(body, path))
+            self._reply(404, {"error": f"no mock for {path}"})
+
+    return Handler
+
+
+def _embeddings(body: dict, path: str) -> dict:
+    inputs = body.get("input")
+    inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+    dim = body.get("dimensions") or 1536
+    tokens = sum(len(str(text).split()) for text in inputs)
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(str(text), dim)}
+            for i, text in enumerate(inputs)
+        ],
+        "model": body.get("model", "mock-embedding"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def _chat(body: dict, path: str) -> dict:
+    messages = body.get("messages") or []
+    question = messages[-1].get("content", "") if messages else ""
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+    content = f"Mock answer to: {question[:200]}"
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock-chat"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content.split()),
+            "total_tokens": prompt_tokens + len(content.split()),
+        },
+    }
+
+
+def _query(body: dict, path: str) -> dict:
+    top_k = min(int(body.get("topK") or 3), len(MOCK_CHUNKS))
+    return {
+        "matches": [
+            {"id": f"mock-{i}", "score": 0.9 - i * 0.05, "values": [],
+             "metadata": {"text": MOCK_CHUNKS[i], "file_name": "mock", "chunk_num": i}}
+            for i in range(top_k)
+        ],
+        "namespace": body.get("namespace", ""),
+        "usage": {"readUnits": 1},
+    }
+
+
+def _describe_index_stats(body: dict, path: str) -> dict:
+    return {"namespaces": {}, "dimension": 1536, "indexFullness": 0.0, "totalVectorCount": 0}
+
+
+def _graph_handler(state: MockState):
+    def handle(body: dict, path: str) -> dict:
+        recipient = body.get("to")
+        if state.on_graph_message is not None:
+            state.on_graph_message(recipient, body)
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": recipient, "wa_id": recipient}],
+            "messages": [{"id": f"wamid.mock-{uuid.uuid4().hex}"}],
+        }
+    return handle
+
+
+class MockServices:
+    """The three stand-in servers, each on its own port and thread."""
+
+    def __init__(self, host: str = "127.0.0.1", ports: tuple = (0, 0, 0), latencies: dict = None,
+                 on_graph_message=None):
+        self.state = MockState(latencies=latencies or {}, on_graph_message=on_graph_message)
+        openai_port, pinecone_port, graph_port = ports
+        self.servers = {
+            "openai": ThreadingHTTPServer((host, openai_port), _handler(self.state, {
+                "/embeddings": ("embeddings", _embeddings),
+                "/chat/completions": ("chat", _chat),
+            })),
+            "pinecone": ThreadingHTTPServer((host, pinecone_port), _handler(self.state, {
+                "/query": ("pinecone", _query),
+                "/describe_index_stats": ("pinecone_stats", _describe_index_stats),
+            })),
+            "graph": ThreadingHTTPServer((host, graph_port), _handler(self.state, {
+                "/messages": ("graph", _graph_handler(self.state)),
+            })),
+        }
+        for server in self.servers.values():
+            server.daemon_threads = True
+        self._threads = []
+
+    def url(self, name: str) -> str:
+        host, port = self.servers[name].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> dict:
+        """Environment that points the app at these servers."""
+        return {
+            "OPENAI_BASE_URL": f"{self.url('openai')}/v1",
+            "PINECONE_HOST_OVERRIDE": self.url("pinecone"),
+            "GRAPH_API_BASE_URL": self.url("graph"),
+        }
+
+    def start(self):
+        for name, server in self.servers.items():
+            t = threading.Thread(target=server.serve_forever, name=f"mock-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"Mock services listening: {self.env()}")
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def stats(self) -> dict:
+        with self.state.lock:
+            return dict(self.state.counts)
+
+
+def latencies_from_args(args) -> dict:
+    return {
+        "embeddings": Latency(args.embed_latency, args.jitter),
+        "chat": Latency(args.chat_latency, args.jitter),
+        "pinecone": Latency(args.pinecone_latency, args.jitter),
+        "pinecone_stats": Latency(args.pinecone_latency, args.jitter),
+        "graph": Latency(args.graph_latency, args.jitter),
+    }
+
+
+def add_latency_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="seconds per embeddings call")
+    parser.add_argument("--chat-latency", type=float, default=1.0, help="seconds per chat completion")
+    parser.add_argument("--pinecone-latency", type=float, default=0.05, help="seconds per Pinecone query")
+    parser.add_argument("--graph-latency", type=float, default=0.2, help="seconds per Graph API send")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency jitter as a fraction of the mean")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run local OpenAI, Pinecone and Graph API stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=8101)
+    parser.add_argument("--pinecone-port", type=int, default=8102)
+    parser.add_argument("--graph-port", type=int, default=8103)
+    parser.add_argument("--print-env", action="store_true", help="print the env vars that point the app at these servers")
+    add_latency_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    services = MockServices(
+        args.host,
+        (args.openai_port, args.pinecone_port, args.graph_port),
+        latencies_from_args(args),
+    )
+    services.start()
+    if args.print_env:
+        for key, value in services.env().items():
+            print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
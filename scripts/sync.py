@@ -1,13 +1,11 @@
 
 import argparse
-from openai import OpenAI
-from pinecone import Pinecone, ServerlessSpec
 import logging
-import time
+
 import config
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from .utils import split_text
+from app import create_app
+from app.models import upgrade_schema
+from app.routes.sync import build_vectors, publish
 
 # Configure logging
 logging.basicConfig(
@@ -17,53 +15,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-pc = Pinecone(
-    api_key=config.PINECONE_API_KEY
-)
-
-openai = OpenAI(
-    api_key=config.OPENAI_API_KEY
-)
-
-def get_drive_service():
-    logger.debug("Initializing Google Drive service")
-    creds = service_account.Credentials.from_service_account_file(
-        config.SERVICE_ACCOUNT_FILE,
-        scopes=['https://www.googleapis.com/auth/drive.readonly']
-    )
-    return build('drive', 'v3', credentials=creds)
-
-
-def list_drive_files():
-    logger.info("Fetching files from Google Drive folder")
-    service = get_drive_service()
-    results = service.files().list(
-        q=f"'{config.GOOGLE_DRIVE_FOLDER_ID}' in parents and trashed = false",
-        fields="files(id, name, mimeType)"
-    ).execute()
-    files = results.get('files', [])
-    logger.info(f"Found {len(files)} files in Drive folder")
-    return files
-
-
-def extract_doc_text(file_id: str) -> str:
-    logger.debug(f"Extracting text content from file ID: {file_id}")
-    service = get_drive_service()
-    doc = service.files().export(
-        fileId=file_id,
-        mimeType='text/plain'
-    ).execute()
-    return doc.decode('utf-8')
-
-
-def create_embedding(text: str):
-    logger.debug("Generating embedding")
-    response = openai.embeddings.create(
-        model=config.EMBED_MODEL,
-        input=text
-    )
-    return response.data[0].embedding
-
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Sync Pinecone documents")
@@ -75,62 +26,11 @@ if __name__ == "__main__":
 
     index_name = config.INDEX_NAME if args.production else config.DEMO_INDEX_NAME
 
-    if pc.has_index(index_name):
-        logger.info(f"Deleting existing index '{index_name}'")
-        pc.delete_index(index_name)
-
-    logger.info(f"Creating new Pinecone index '{index_name}'")
-    pc.create_index(index_name, dimension=1536, metric="cosine", spec=ServerlessSpec(cloud="aws", region="us-east-1"))
-
-    index = pc.Index(index_name)
-
-    logger.info("Starting document processing")
-    files = list_drive_files()
-
-    for file in files:
-        try:
-            logger.info(f"Processing file: {file['name']} (ID: {file['id']})")
-            content = extract_doc_text(file['id'])
-
-            chunks = split_text(content)
-            logger.info(f"Split {file['name']} into {len(chunks)} chunks")
-
-            file_id, file_name = file['id'], file['name']
-
-            start_time = time.time()
-            logger.info(f"Processing {len(chunks)} chunks for file: {file_name}")
-
-            vectors = []
-
-            for idx, chunk in enumerate(chunks):
-                vectors.append({
-                    'id': f"{file_id}_{idx}",
-                    'values': create_embedding(chunk),
-                    'metadata': {
-                        'text': chunk,
-                        'source': 'google-drive',
-                        'file_id': file_id,
-                        'file_name': file_name,
-                        'chunk_num': idx
-                    }
-                })
-
-                if (idx + 1) % 10 == 0:
-                    logger.debug(f"Processed {idx + 1}/{len(chunks)} chunks")
-
-            # Batch upsert
-            total_batches = (len(vectors) + 99) // 100
-            for i in range(0, len(vectors), 100):
-                batch = vectors[i:i + 100]
-                current_batch = (i // 100) + 1
-                logger.debug(f"Upserting batch {current_batch}/{total_batches}")
-                index.upsert(vectors=batch)
-
-            elapsed_time = time.time() - start_time
-            logger.info(f"Completed processing {file_name} in {elapsed_time:.2f} seconds")
-            logger.info(f"Successfully indexed {file['name']}")
-
-        except Exception as e:
-            logger.error(f"Failed to process {file['name']}: {str(e)}", exc_info=True)
+    # Same pipeline as POST /sync: build a new generation, validate it, then flip readers to it
+    with create_app().app_context():
+        # The alias, manifest and campaign tables may be newer than this database
+        upgrade_schema()
+        vectors, records = build_vectors()
+        publish(index_name, vectors, records)
 
-    logger.info("Document processing completed")
\ No newline at end of file
+    logger.info("Document processing completed")
@@ -1,7 +1,9 @@
 import logging
 
+import config
 from app import create_app
-from app.extensions import db
+from app.models import upgrade_schema
+from app.utils import outbox
 
 
 app = create_app()
@@ -10,9 +12,13 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     logging.info("Initializing database...")
 
-    # Create tables if they don't exist
+    # Create tables if they don't exist and bring existing ones up to date
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
+
+    if config.OUTBOX_ENABLED:
+        # Drain replies left unsent by a previous run
+        outbox.sender.start()
 
     logging.info("Flask app started")
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,31 @@
+import os
+
+# Importing the app builds the OpenAI and Pinecone clients; nothing here talks to them
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("PINECONE_API_KEY", "test")
+os.environ.setdefault("RETRIEVER_BACKEND", "local")
+os.environ.setdefault("EMBED_STORE_PATH", "")
+
+import pytest
+
+import config
+from app import create_app
+from app.extensions import db
+from app.models import upgrade_schema
+from app.utils import whatsapp
+from app.utils.dedup import RecentIds
+from app.utils.history import HistoryCache
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    # Per-process caches must not carry users or message ids across tests
+    monkeypatch.setattr(whatsapp, "history_cache", HistoryCache(window=config.HISTORY_WINDOW))
+    monkeypatch.setattr(whatsapp, "recent_message_ids", RecentIds())
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
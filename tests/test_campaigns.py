@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.utils import campaigns
+
+
+@pytest.fixture
+def synced(app):
+    today = date.today()
+    campaigns.sync_campaigns([
+        {"id": "1", "name": "Shopee KL", "brand_name": "Shopee", "location": "Kuala Lumpur",
+         "start_date": (today - timedelta(days=10)).isoformat(), "end_date": (today + timedelta(days=60)).isoformat(),
+         "pay_per_month": "RM 300"},
+        {"id": "2", "name": "Grab Penang", "brand_name": "Grab", "location": "Penang",
+         "start_date": (today - timedelta(days=5)).isoformat(), "end_date": (today + timedelta(days=30)).isoformat(),
+         "pay_per_month": 250},
+    ])
+    yield
+    campaigns.vocabulary.invalidate()
+
+
+@pytest.mark.parametrize("message", [
+    "payment saya bulan ni belum masuk lagi",
+    "sticker shopee saya tertanggal, boleh ganti?",
+])
+def test_filter_alone_supplements_retrieval(synced, message):
+    query = campaigns.parse_query(message)
+    assert query is not None and query.filtered
+    assert not query.exclusive
+
+    context, exclusive = campaigns.fast_context(message)
+    assert context is not None
+    assert not exclusive
+
+
+@pytest.mark.parametrize("message, brands, locations", [
+    ("how much does the grab campaign pay", {"grab"}, set()),
+    ("berapa bayaran campaign shopee di kl", {"shopee"}, {"kuala lumpur"}),
+])
+def test_rate_question_with_filter_is_exclusive(synced, message, brands, locations):
+    query = campaigns.parse_query(message)
+    assert query.rates
+    assert query.brands == brands
+    assert query.locations == locations
+    assert query.exclusive
+
+    context, exclusive = campaigns.fast_context(message)
+    assert exclusive
+    assert "Grab Penang" in context if "grab" in brands else "Shopee KL" in context
+
+
+def test_listing_is_exclusive(synced):
+    query = campaigns.parse_query("campaign apa yang ada sekarang?")
+    assert query.listing
+    assert query.exclusive
+
+
+@pytest.mark.parametrize("message", [
+    "macam mana nak join campaign shopee",
+    "how do I apply for the grab campaign",
+    "berapa lama payment campaign masuk?",
+])
+def test_process_questions_are_not_rate_questions(synced, message):
+    query = campaigns.parse_query(message)
+    assert query is None or not query.exclusive
+
+
+def test_unrelated_message_is_skipped(synced):
+    assert campaigns.fast_context("akaun saya kena block") == (None, False)
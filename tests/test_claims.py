@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from app.extensions import db
+from app.models import OutboundMessage, WhatsappMessage
+from app.utils import outbox, whatsapp
+from app.utils.ingest import MessageEvent
+
+
+@pytest.fixture
+def replies(app, monkeypatch):
+    monkeypatch.setattr(config, "OUTBOX_ENABLED", True)
+    monkeypatch.setattr(config, "SUMMARY_ENABLED", False)
+    monkeypatch.setattr(config, "CAMPAIGN_FAST_PATH_ENABLED", False)
+    monkeypatch.setattr(outbox.sender, "start", lambda: None)
+    answers = []
+
+    def generate_response(req, wa_id, chat_history=None, message_id=None):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(whatsapp, "generate_response", generate_response)
+    return answers
+
+
+def event():
+    return MessageEvent(wa_id="111", message_id="wamid.1", type="text", text="bila payment masuk?",
+                        phone_number_id="pn")
+
+
+def test_failed_reply_releases_the_claim(replies):
+    replies.extend([RuntimeError("completion failed"), "Hujung bulan."])
+
+    with pytest.raises(RuntimeError):
+        whatsapp.process_message_event(event())
+    assert OutboundMessage.query.count() == 0
+
+    whatsapp.process_message_event(event())
+    assert [row.payload["text"]["body"] for row in OutboundMessage.query.all()] == ["Hujung bulan."]
+    assert WhatsappMessage.query.filter_by(wa_message_id="wamid.1").one().claimed_until is None
+
+    # Answered now, so later re-deliveries are duplicates
+    whatsapp.process_message_event(event())
+    assert OutboundMessage.query.count() == 1
+
+
+def test_abandoned_claim_is_taken_over_once_it_expires(replies):
+    replies.append("Hujung bulan.")
+    _, claimed = whatsapp.claim_message(event())
+    assert claimed
+
+    # The process that claimed it died before replying
+    assert not whatsapp.claim_message(event())[1]
+
+    message = WhatsappMessage.query.filter_by(wa_message_id="wamid.1").one()
+    message.claimed_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    whatsapp.process_message_event(event())
+    assert OutboundMessage.query.count() == 1
+    assert WhatsappMessage.query.filter_by(is_received=True).count() == 1
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from app.utils.embedding_store import EmbeddingStore
+
+DIM = 4
+
+
+def vector(i):
+    return [float(i), float(i) + 0.5, -float(i), 1.0]
+
+
+def fill(store, model, count):
+    embeddings = {store.make_key(f"{model}-{i}", model): vector(i) for i in range(count)}
+    store.put_many(model, embeddings)
+    return list(embeddings)
+
+
+def run_together(*calls):
+    barrier = threading.Barrier(len(calls))
+    results, errors = [None] * len(calls), []
+
+    def run(i, call):
+        barrier.wait()
+        try:
+            results[i] = call()
+        except Exception as e:  # surfaced below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    return results
+
+
+@pytest.mark.parametrize("round_", range(5))
+def test_two_stores_compacting_different_models_keep_both_compactions(tmp_path, round_):
+    first, second = EmbeddingStore(str(tmp_path), DIM), EmbeddingStore(str(tmp_path), DIM)
+    a_keys = fill(first, "model-a", 40)
+    b_keys = fill(second, "model-b", 40)
+
+    removed = run_together(
+        lambda: first.compact("model-a", set(a_keys[:10])),
+        lambda: second.compact("model-b", set(b_keys[:20])),
+    )
+    assert sorted(removed) == [20, 30]
+
+    for store in (first, second, EmbeddingStore(str(tmp_path), DIM)):
+        found = store.get_many(a_keys + b_keys)
+        assert set(found) == set(a_keys[:10] + b_keys[:20])
+        assert found[a_keys[3]] == vector(3)
+        assert found[b_keys[17]] == vector(17)
+        assert len(store) == 30
+
+
+def test_two_stores_compacting_the_same_model_compact_once(tmp_path):
+    first, second = EmbeddingStore(str(tmp_path), DIM), EmbeddingStore(str(tmp_path), DIM)
+    keys = fill(first, "model-a", 40)
+    referenced = set(keys[::2])
+
+    removed = run_together(
+        lambda: first.compact("model-a", referenced),
+        lambda: second.compact("model-a", referenced),
+    )
+    # Whoever gets the lock second sees the compacted version and has nothing left to drop
+    assert sorted(removed) == [0, 20]
+
+    files = sorted(p.name for p in tmp_path.iterdir() if p.name.startswith(("vectors-", "keys-")))
+    assert files == ["keys-1.txt", "vectors-1.f32"]
+    found = second.get_many(keys)
+    assert set(found) == referenced
+    assert found[keys[6]] == vector(6)
+
+
+def test_rows_appended_elsewhere_are_visible_after_a_compaction(tmp_path):
+    first, second = EmbeddingStore(str(tmp_path), DIM), EmbeddingStore(str(tmp_path), DIM)
+    keys = fill(first, "model-a", 8)
+    assert first.compact("model-a", set(keys[:2])) == 6
+
+    late = fill(second, "model-b", 3)
+    assert set(first.get_many(keys + late)) == set(keys[:2] + late)
@@ -0,0 +1,106 @@
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import config
+from app.extensions import db
+from app.models import OutboundMessage
+from app.utils import outbox
+
+
+class FakeResponse:
+    ok = True
+    status_code = 200
+    text = ""
+
+    def __init__(self, wa_message_id):
+        self._body = {"messages": [{"id": wa_message_id}]}
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [datetime.utcnow()]
+    monkeypatch.setattr(outbox, "datetime", SimpleNamespace(utcnow=lambda: now[0]))
+    return now
+
+
+def make_sender(app):
+    sender = outbox.OutboxSender(size=1, batch_size=10)
+    sender.init_app(app)
+    return sender
+
+
+def add_rows(*recipients):
+    for recipient in recipients:
+        db.session.add(OutboundMessage(
+            phone_number_id="pn",
+            recipient=recipient,
+            payload={"to": recipient, "text": {"body": f"reply to {recipient}"}},
+            next_attempt_at=datetime.utcnow() - timedelta(seconds=1),
+        ))
+    db.session.commit()
+
+
+def test_lease_expiring_during_a_send_is_not_sent_twice(app, clock, monkeypatch):
+    monkeypatch.setattr(config, "OUTBOX_LEASE_SECONDS", 60)
+    first, second = make_sender(app), make_sender(app)
+    add_rows("111", "222", "333")
+    posts = []
+
+    def drain_elsewhere():
+        with app.app_context():
+            second._drain_once()
+
+    def post(url, json, headers):
+        posts.append(json["to"])
+        if json["to"] == "111":
+            clock[0] += timedelta(seconds=40)
+        elif json["to"] == "222" and threading.current_thread() is threading.main_thread():
+            # 70s after the claim: 333's claim-time lease is over, 222's renewed lease is not
+            clock[0] += timedelta(seconds=30)
+            thread = threading.Thread(target=drain_elsewhere)
+            thread.start()
+            thread.join()
+        return FakeResponse(f"wamid.{json['to']}")
+
+    monkeypatch.setattr(outbox.http, "post", post)
+    assert first._drain_once() == 3
+
+    assert sorted(posts) == ["111", "222", "333"]
+    assert first.stats()["lease_lost"] == 1
+    assert second.stats()["sent"] == 1
+    rows = OutboundMessage.query.order_by(OutboundMessage.recipient).all()
+    assert [(row.status, row.attempts) for row in rows] == [("sent", 1), ("sent", 1), ("sent", 1)]
+
+
+def test_expired_lease_is_reclaimed_after_a_crash(app, clock):
+    add_rows("111")
+    crashed = make_sender(app)
+    rows, _ = crashed._claim()
+    assert len(rows) == 1
+
+    other = make_sender(app)
+    assert other._claim()[0] == []
+    clock[0] += timedelta(seconds=config.OUTBOX_LEASE_SECONDS + 1)
+    assert len(other._claim()[0]) == 1
+
+
+def test_reply_is_in_history_before_it_is_sent(app, monkeypatch):
+    from app.utils import whatsapp
+
+    monkeypatch.setattr(config, "OUTBOX_ENABLED", True)
+    monkeypatch.setattr(config, "SUMMARY_ENABLED", False)
+    monkeypatch.setattr(outbox.sender, "start", lambda: None)
+    assert whatsapp.retrieve_user_message_as_history("111") == []
+
+    whatsapp.deliver_reply("111", "Hai!", phone_number_id="pn")
+
+    assert OutboundMessage.query.one().status == "pending"
+    assert whatsapp.retrieve_user_message_as_history("111") == [{"role": "assistant", "content": "Hai!"}]
+    saved = whatsapp.WhatsappMessage.query.one()
+    assert (saved.user_id, saved.text, saved.is_received) == ("111", "Hai!", False)
@@ -0,0 +1,35 @@
+from app.extensions import db
+from app.models import WhatsappMessage
+from app.utils import llm, summaries
+
+
+def add_turns(count, start=0, user_id="111"):
+    for i in range(start, start + count):
+        db.session.add(WhatsappMessage(user_id=user_id, text=f"m{i}", is_received=i % 2 == 0, wa_message_id=f"wamid.{i}"))
+    db.session.commit()
+
+
+def test_unfolded_turns_older_than_the_window_are_sent_verbatim(app):
+    add_turns(7)
+
+    assert summaries.get_summary("111", window=4) == (
+        "Later messages, not summarized yet:\nuser: m0\nassistant: m1\nuser: m2"
+    )
+    # The message being answered was saved already, but it is not part of the history window
+    assert summaries.get_summary("111", window=4, exclude_message_id="wamid.6") == (
+        "Later messages, not summarized yet:\nuser: m0\nassistant: m1"
+    )
+    assert summaries.get_summary("111", window=7) == ""
+
+
+def test_folded_turns_leave_the_verbatim_tail(app, monkeypatch):
+    add_turns(9)
+    monkeypatch.setattr(llm, "summarize", lambda previous, turns: f"{len(turns)} turns")
+
+    assert summaries.fold("111", window=4, min_messages=4)
+    assert summaries.get_summary("111", window=4) == "5 turns"
+
+    add_turns(2, start=9)
+    assert summaries.get_summary("111", window=4) == (
+        "5 turns\n\nLater messages, not summarized yet:\nassistant: m5\nuser: m6"
+    )
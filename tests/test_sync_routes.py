@@ -0,0 +1,28 @@
+import pytest
+
+import config
+from app.utils import generations
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def test_rollback_requires_the_sync_key(client, monkeypatch):
+    monkeypatch.setattr(config, "SYNC_API_KEY", "secret")
+    rolled_back = []
+    monkeypatch.setattr(generations, "rollback", lambda name: rolled_back.append(name) or "gen-1")
+
+    assert client.post("/sync/rollback").status_code == 403
+    assert client.post("/sync/rollback", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert rolled_back == []
+
+    response = client.post("/sync/rollback?target=demo", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert rolled_back == [config.DEMO_INDEX_NAME]
+
+
+def test_sync_is_refused_without_a_configured_key(client, monkeypatch):
+    monkeypatch.setattr(config, "SYNC_API_KEY", None)
+    assert client.post("/sync", headers={"Authorization": "Bearer "}).status_code == 403
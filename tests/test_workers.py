@@ -0,0 +1,31 @@
+import threading
+
+from app.utils.workers import MessageWorkerPool
+
+
+def test_concurrent_first_submits_all_reach_a_worker(app):
+    handled = []
+    done = threading.Semaphore(0)
+
+    def handle(payload):
+        handled.append(payload)
+        done.release()
+
+    pool = MessageWorkerPool(size=8, queue_size=100)
+    pool.init_app(app, handle)
+    barrier = threading.Barrier(32)
+
+    def submit(i):
+        barrier.wait()
+        assert pool.submit(f"user-{i}", i)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(32)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for _ in range(32):
+        assert done.acquire(timeout=5)
+
+    assert sorted(handled) == list(range(32))
+    assert pool.stats()["submitted"] == 32